@@ -0,0 +1,139 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# Copyright (c) 2023-2024 The Regents of the University of Michigan.
+# This file is from the StructuralGT project, released under the BSD 3-Clause
+# License.
+
+# Compiled counterparts of the tracing functions in sknwEdits.py. Each function
+# follows its pure Python namesake statement for statement, so that
+# build_sknw returns identical graphs whichever backend is used.
+import numpy as np
+
+
+cdef object idx2rc(long long[:] idx, Py_ssize_t n, long long[:] acc):
+    cdef Py_ssize_t i, j
+    cdef Py_ssize_t dim = acc.shape[0]
+    cdef long long v, r
+    rst = np.zeros((n, dim), dtype=np.int16)
+    cdef short[:, :] _rst = rst
+    for i in range(n):
+        v = idx[i]
+        for j in range(dim):
+            r = v // acc[j]
+            _rst[i, j] = <short>(r - 1)
+            v -= r * acc[j]
+    return rst
+
+
+cdef tuple fill(int[:] img, Py_ssize_t p, int num,
+                long long[:] nbs, long long[:] acc, long long[:] buf):
+    cdef Py_ssize_t cur = 0
+    cdef Py_ssize_t s = 1
+    cdef Py_ssize_t k, cp
+    cdef bint iso = True
+
+    img[p] = num
+    buf[0] = p
+    while True:
+        p = buf[cur]
+        for k in range(nbs.shape[0]):
+            cp = p + nbs[k]
+            if img[cp] == 2:
+                img[cp] = num
+                buf[s] = cp
+                s += 1
+            if img[cp] == 1:
+                iso = False
+        cur += 1
+        if cur == s:
+            break
+    return iso, idx2rc(buf, s, acc)
+
+
+cdef tuple trace(int[:] img, Py_ssize_t p, long long[:] nbs,
+                 long long[:] acc, long long[:] buf):
+    cdef int c1 = 0
+    cdef int c2 = 0
+    cdef Py_ssize_t newp = 0
+    cdef Py_ssize_t cur = 1
+    cdef Py_ssize_t k, cp
+
+    while True:
+        buf[cur] = p
+        img[p] = 0
+        cur += 1
+        for k in range(nbs.shape[0]):
+            cp = p + nbs[k]
+            if img[cp] >= 10:
+                if c1 == 0:
+                    c1 = img[cp]
+                    buf[0] = cp
+                else:
+                    c2 = img[cp]
+                    buf[cur] = cp
+            if img[cp] == 1:
+                newp = cp
+        p = newp
+        if c2 != 0:
+            break
+
+    return (c1 - 10, c2 - 10, idx2rc(buf, cur + 1, acc))
+
+
+def parse_struc(img, nbs, acc, iso, ring):
+    """Compiled equivalent of :func:`StructuralGT.sknwEdits.parse_struc`.
+
+    Args:
+        img (:class:`numpy.ndarray`):
+            The padded, marked skeleton, as a contiguous int32 array. It is
+            modified in place.
+        nbs (:class:`numpy.ndarray`):
+            Relative indices of the neighbours of a voxel in the raveled
+            image.
+        acc (:class:`numpy.ndarray`):
+            Strides used to convert raveled indices to coordinates.
+        iso (bool):
+            Whether to keep isolated nodes.
+        ring (bool):
+            Whether to extract rings, which have no nodes.
+
+    Returns:
+        list: The voxel coordinates of each node.
+        list: The (start, end, voxel coordinates) of each edge.
+    """
+    cdef int[:] _img = img.ravel()
+    cdef long long[:] _nbs = np.ascontiguousarray(nbs, dtype=np.int64)
+    cdef long long[:] _acc = np.ascontiguousarray(acc, dtype=np.int64)
+    cdef long long[:] buf = np.zeros(np.count_nonzero(img) + 2,
+                                     dtype=np.int64)
+    cdef Py_ssize_t size = _img.shape[0]
+    cdef Py_ssize_t p, k
+    cdef int num = 10
+    cdef bint isiso
+
+    nodes = []
+    for p in range(size):
+        if _img[p] == 2:
+            isiso, nds = fill(_img, p, num, _nbs, _acc, buf)
+            if isiso and not iso:
+                continue
+            num += 1
+            nodes.append(nds)
+    edges = []
+    for p in range(size):
+        if _img[p] < 10:
+            continue
+        for k in range(_nbs.shape[0]):
+            if _img[p + _nbs[k]] == 1:
+                edges.append(trace(_img, p + _nbs[k], _nbs, _acc, buf))
+    if not ring:
+        return nodes, edges
+    for p in range(size):
+        if _img[p] != 1:
+            continue
+        _img[p] = num
+        num += 1
+        nodes.append(idx2rc(np.array([p], dtype=np.int64), 1, _acc))
+        for k in range(_nbs.shape[0]):
+            if _img[p + _nbs[k]] == 1:
+                edges.append(trace(_img, p + _nbs[k], _nbs, _acc, buf))
+    return nodes, edges
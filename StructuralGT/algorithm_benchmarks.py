@@ -2,6 +2,8 @@
 # This file is from the StructuralGT project, released under the BSD 3-Clause
 # License.
 
+import json
+import multiprocessing
 import timeit
 
 import numpy as np
@@ -69,3 +71,185 @@ def effective_resistance():
 
     for test_name, result in sorted(results.items(), key=lambda x: x[1]):
         print(test_name, result)
+
+
+def _lattice_skeleton(shape, spacing=16):
+    """Returns a skeleton of one voxel thick lines, spaced regularly along
+    each axis, with the given shape."""
+    ske = np.zeros(shape, dtype=int)
+    for axis in range(len(shape)):
+        index = [slice(None)] * len(shape)
+        index[axis] = slice(0, shape[axis], spacing)
+        ske[tuple(index)] = 1
+    return ske
+
+
+def _peak_rss(func, *args):
+    """Runs func in a fresh process and returns the peak resident set size
+    of that process, in MB. Only supported on Unix."""
+    import resource
+
+    def target(queue):
+        func(*args)
+        queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    process = ctx.Process(target=target, args=(queue,))
+    process.start()
+    peak = queue.get()
+    process.join()
+
+    return peak / 1024
+
+
+def build_sknw_memory():
+    """Benchmark for the peak memory of graph extraction from small and large
+    2D and 3D skeletons. The baseline is the peak resident set size of a
+    process which only allocates the skeleton.
+    """
+
+    from StructuralGT import sknwEdits
+
+    def baseline(shape):
+        _lattice_skeleton(shape)
+
+    def extract(shape):
+        sknwEdits.build_sknw(_lattice_skeleton(shape))
+
+    for shape in ((256, 256), (2048, 2048), (32, 128, 128), (64, 512, 512)):
+        base_rss = _peak_rss(baseline, shape)
+        rss = _peak_rss(extract, shape)
+        print(
+            f"build_sknw on {shape}: peak RSS {rss:.1f} MB "
+            f"({rss - base_rss:.1f} MB above baseline)"
+        )
+
+
+def binarize_scaling(workers=(1, 2, 4, 8), repeat=3):
+    """Benchmark for the wall time of binarizing the 3D ANF test stack with
+    different numbers of worker threads.
+    """
+
+    import tempfile
+
+    import StructuralGT
+    from StructuralGT.networks import Network
+
+    anf_path = StructuralGT.__path__[0] + "/pytest/data/ANF"
+    with open(anf_path + "/img_options.json") as f:
+        options = json.load(f)
+
+    with tempfile.TemporaryDirectory() as stack_dir:
+        N = Network(anf_path, binarized_dir=stack_dir, dim=3)
+        for n in workers:
+            times = timeit.repeat(
+                lambda n=n: N.binarize(options=options, workers=n),
+                repeat=repeat,
+                number=1,
+            )
+            print(f"binarize with {n} workers: {min(times):.3f} s")
+
+
+def pipeline_memory(shape=(64, 512, 512), spacing=16):
+    """Benchmark for the peak memory of each stage of the image to graph
+    pipeline, for a synthetic 3D stack of the given shape. Each stage is run
+    in a fresh process, together with the stages before it, and its increase
+    in peak resident set size over the previous stage is reported.
+    """
+
+    import os
+    import tempfile
+
+    import cv2 as cv
+
+    from StructuralGT.networks import Network
+
+    options = {
+        "Thresh_method": 0,
+        "gamma": 1,
+        "md_filter": 0,
+        "g_blur": 0,
+        "autolvl": 0,
+        "fg_color": 0,
+        "laplacian": 0,
+        "scharr": 0,
+        "sobel": 0,
+        "lowpass": 0,
+        "asize": 3,
+        "bsize": 1,
+        "wsize": 1,
+        "thresh": 127,
+    }
+
+    def run(stack_dir, stage):
+        N = Network(stack_dir, binarized_dir="Binarized", dim=3)
+        if stage == "set_img_bin":
+            N.set_img_bin(None)
+        elif stage in ("img_to_skel", "set_graph"):
+            N.img_to_skel(write=False)
+        if stage == "set_graph":
+            N.set_graph(write=False)
+
+    with tempfile.TemporaryDirectory() as stack_dir:
+        ske = _lattice_skeleton(shape, spacing=spacing).astype(np.uint8) * 255
+        for i, _slice in enumerate(ske):
+            cv.imwrite(os.path.join(stack_dir, f"slice{i:04d}.tiff"), _slice)
+        Network(stack_dir, binarized_dir="Binarized", dim=3).binarize(
+            options=options
+        )
+        del ske
+
+        previous = None
+        for stage in ("Network", "set_img_bin", "img_to_skel", "set_graph"):
+            rss = _peak_rss(run, stack_dir, stage)
+            increase = "" if previous is None else f" (+{rss - previous:.1f})"
+            print(f"{stage} on {shape}: peak RSS {rss:.1f} MB{increase}")
+            previous = rss
+
+
+def node_labelling_scaling(edges=(25000, 50000, 100000, 200000), length=8):
+    """Benchmark for the wall time of :meth:`Network.node_labelling` on
+    synthetic 3D graphs with increasing numbers of edges. Each edge is a
+    straight line of :code:`length` voxels between two single voxel nodes,
+    so the time per edge should be constant.
+    """
+
+    import os
+    import tempfile
+
+    import igraph as ig
+
+    import StructuralGT
+    from StructuralGT.networks import Network
+
+    anf_path = StructuralGT.__path__[0] + "/pytest/data/ANF"
+    with open(anf_path + "/img_options.json") as f:
+        options = json.load(f)
+
+    with tempfile.TemporaryDirectory() as stack_dir:
+        # The graph of a small crop is replaced by each synthetic graph
+        N = Network(anf_path, binarized_dir=stack_dir, dim=3)
+        N.binarize(options=options)
+        N.img_to_skel(crop=[200, 300, 200, 300, 281, 288], write=False)
+        for n in edges:
+            line = np.zeros((length, 3), dtype=np.int16)
+            line[:, 0] = np.arange(length)
+            G = ig.Graph(n=2 * n, edges=[(2 * i, 2 * i + 1) for i in range(n)])
+            G.vs["pts"] = [line[[0]] + (0, 0, i) for i in range(2 * n)]
+            G.vs["o"] = [line[0] + (0, 0, i) for i in range(2 * n)]
+            G.es["pts"] = [line + (0, 0, 2 * i) for i in range(n)]
+            N.Gr = G
+            filename = os.path.join(stack_dir, "labelled.gsd")
+
+            times = timeit.repeat(
+                lambda: N.node_labelling(
+                    np.arange(2 * n), "ID", filename, csv_write=False
+                ),
+                repeat=3,
+                number=1,
+            )
+            print(
+                f"node_labelling with {n} edges: {min(times):.3f} s "
+                f"({1e6 * min(times) / n:.2f} us per edge)"
+            )
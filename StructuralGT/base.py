@@ -2,6 +2,7 @@
 # This file is from the StructuralGT project, released under the BSD 3-Clause
 # License.
 
+import logging
 import time
 
 import cv2 as cv
@@ -12,6 +13,8 @@ from skimage.morphology import (ball, binary_closing, disk,
 
 from StructuralGT import GetWeights_3d, error, skel_ID, sknwEdits
 
+logger = logging.getLogger(__name__)
+
 
 def read(name, read_type):
     """For raising an error when a file does not exist because cv.imread does
@@ -61,32 +64,47 @@ def connector(point1, point2):
         :class:`numpy.ndarray`: Array of lattice points connecting point1
         and point2
     """
-    vec = point2 - point1
-    edge = np.array([point1])
-    for i in np.linspace(0, 1):
-        edge = np.append(
-            edge, np.array([point1 + np.multiply(i, vec)]), axis=0
-        )
-    edge = edge.astype(int)
-    edge = np.unique(edge, axis=0)
+    return connectors(point1, [point2])[0]
+
 
-    return edge
+def connectors(point1, points2, n=50):
+    """For a point on a lattice, this function returns the lattice points
+    which join it to each of several other points. All the lines are
+    sampled at once, rather than one at a time with :func:`connector`.
+
+    Args:
+        point1 (list[int]):
+            Coordinates of the shared first point.
+        points2 (list[list[int]]):
+            Coordinates of each second point.
+        n (int, optional):
+            The number of samples along each line.
+
+    Returns:
+        list[:class:`numpy.ndarray`]: For each of points2, the array of
+        lattice points connecting it to point1, ordered from point1.
+    """
+    point1 = np.asarray(point1)
+    points2 = np.asarray(points2).reshape(-1, len(point1))
+    if len(points2) == 0:
+        return []
+    t = np.linspace(0, 1, n)
+    lines = (
+        point1 + t[None, :, None] * (points2 - point1)[:, None, :]
+    ).astype(int)
+    # Truncation is monotonic along a line, so repeated lattice points are
+    # always consecutive
+    keep = np.ones(lines.shape[:2], dtype=bool)
+    keep[:, 1:] = np.any(lines[:, 1:] != lines[:, :-1], axis=2)
+
+    return np.split(lines[keep], np.cumsum(keep.sum(axis=1))[:-1])
 
 
 def split(array, splitpoints):
     """Function which splits numpy array into list of arrays, according to
     the split points specified in splitpoints (which is a list of the array
     lengths."""
-    splitpoints = np.pad(
-        splitpoints, (1, 1), "constant", constant_values=(0, 0)
-    )
-    L = []
-    k = 0
-    for i, j in zip(splitpoints[0 : len(splitpoints)], splitpoints[1::]):
-        L.append(array[i + k : i + j + k])
-        k += i
-
-    return L
+    return np.split(array, np.cumsum(splitpoints, dtype=np.int64)[:-1])
 
 
 def shift(points, _2d=False, _shift=None):
@@ -221,16 +239,30 @@ def dim_red(positions):
 
     return positions
 
-def G_to_gsd(G, skel_name, box=False):
+def G_to_frame(G, box=False):
+    """Returns a :class:`gsd.hoomd.Frame` with a particle at each node
+    centroid and at each point of each edge of a graph.
+
+    Args:
+        G (:class:`igraph.Graph`):
+            The graph, with :code:`"o"` node and :code:`"pts"` edge
+            attributes.
+        box (bool, optional):
+            Whether to centre the particles in a box which contains them.
+
+    Returns:
+        :class:`gsd.hoomd.Frame`: The frame.
+    """
     dim = len(G.vs[0]["o"])
 
-    positions = np.asarray(list(G.vs[i]["o"] for i in range(G.vcount())))
-    for i in range(G.ecount()):
-        positions = np.append(positions, G.es[i]["pts"], axis=0)
+    positions = np.concatenate(
+        [np.asarray(G.vs["o"]).reshape(-1, dim)]
+        + [np.asarray(pts).reshape(-1, dim) for pts in G.es["pts"]]
+    )
 
     N = len(positions)
     if dim == 2:
-        positions = np.append([np.zeros(N)], positions.T, axis=0).T
+        positions = np.column_stack((np.zeros(N), positions))
 
     s = gsd.hoomd.Frame()
     s.particles.N = N
@@ -246,9 +278,26 @@ def G_to_gsd(G, skel_name, box=False):
     else:
         s.particles.position, _ = shift(positions)
 
+    return s
+
+
+def write_frame(s, skel_name):
+    """Writes a single frame to a new .gsd file.
+
+    Args:
+        s (:class:`gsd.hoomd.Frame`):
+            The frame to write.
+        skel_name (str):
+            The file name to write.
+    """
     with gsd.hoomd.open(name=skel_name, mode="w") as f:
         f.append(s)
 
+
+def G_to_gsd(G, skel_name, box=False):
+    write_frame(G_to_frame(G, box=box), skel_name)
+
+
 def gsd_to_G(skel_name, sub=False, _2d=False, crop=None):
     """Function takes gsd rendering of a skeleton and returns the list of
     nodes and edges, as calculated by sknw.
@@ -301,10 +350,53 @@ def gsd_to_G(skel_name, sub=False, _2d=False, crop=None):
         list(
             (max(positions.T[i]) + 1)
             for i in list(range(min(positions.shape)))
-        )
+        ),
+        dtype=bool,
     )
-    canvas[tuple(list(positions.T))] = 1
-    canvas = canvas.astype(int)
+    canvas[tuple(list(positions.T))] = True
+
+    G = sknwEdits.build_sknw(canvas)
+
+    if sub:
+        G = sub_G(G)
+
+    return G
+
+
+def skel_to_G(skeleton, sub=False, _2d=False):
+    """Function takes an in-memory skeleton and returns the graph, as
+    calculated by sknw. The returned graph is the same as the one returned by
+    :func:`gsd_to_G` for a file written from the same skeleton, but no file
+    is read and the skeleton is not re-rasterised.
+
+    Args:
+        skeleton (:class:`numpy.ndarray`):
+            The skeleton, where non-zero voxels belong to the skeleton. 2D
+            skeletons should have a leading axis of length 1.
+        sub (optional, bool):
+            Whether to return only to largest connected component. If True, it
+            will reduce the returned graph to the largest connected induced
+            subgraph, resetting node numbers to consecutive integers,
+            starting from 0.
+        _2d (optional, bool):
+            Whether the skeleton is 2D.
+
+    Returns:
+        (:class:`igraph.Graph`): The extracted :class:`igraph.Graph` object.
+    """
+    skeleton = np.asarray(skeleton) != 0
+
+    # Crop to the bounding box of the skeleton, which is equivalent to
+    # shifting the skeleton positions such that their minimum is the origin.
+    bounds = []
+    for axis in range(skeleton.ndim):
+        other_axes = tuple(i for i in range(skeleton.ndim) if i != axis)
+        occupied = np.flatnonzero(skeleton.any(axis=other_axes))
+        bounds.append(slice(occupied[0], occupied[-1] + 1))
+    canvas = skeleton[tuple(bounds)]
+
+    if _2d:
+        canvas = canvas.reshape(canvas.shape[1:])
 
     G = sknwEdits.build_sknw(canvas)
 
@@ -314,15 +406,52 @@ def gsd_to_G(skel_name, sub=False, _2d=False, crop=None):
     return G
 
 
+def positions_to_G(positions, sub=False, _2d=False):
+    """Function takes the positions of skeleton voxels and returns the graph,
+    as calculated by sknw. The returned graph is the same as the one returned
+    by :func:`skel_to_G` for the equivalent dense skeleton, but the dense
+    skeleton is never allocated.
+
+    Args:
+        positions (:class:`numpy.ndarray`):
+            The (N, 3) voxel coordinates of the skeleton. 2D skeletons should
+            have a first coordinate of 0.
+        sub (optional, bool):
+            Whether to return only to largest connected component. If True, it
+            will reduce the returned graph to the largest connected induced
+            subgraph, resetting node numbers to consecutive integers,
+            starting from 0.
+        _2d (optional, bool):
+            Whether the skeleton is 2D.
+
+    Returns:
+        (:class:`igraph.Graph`): The extracted :class:`igraph.Graph` object.
+    """
+    positions = np.asarray(positions)
+    if _2d:
+        positions = positions[:, 1:]
+
+    G = sknwEdits.build_sknw_sparse(positions)
+
+    if sub:
+        G = sub_G(G)
+
+    return G
+
+
 def sub_G(G):
     """Function generates largest connected induced subgraph. Node and edge
     numbers are reset such that they are consecutive integers, starting
     from 0."""
 
-    print(f"Before removing smaller components, graph has {G.vcount()}  nodes")
+    logger.info(
+        "Before removing smaller components, graph has %d nodes", G.vcount()
+    )
     components = G.connected_components()
     G = components.giant()
-    print(f"After removing smaller components, graph has {G.vcount()}  nodes")
+    logger.info(
+        "After removing smaller components, graph has %d nodes", G.vcount()
+    )
 
     # G_sub  = G.subgraph(max(nx.connected_components(G), key=len).copy())
     # G = nx.relabel.convert_node_labels_to_integers(G_sub)
@@ -351,17 +480,11 @@ def debubble(g, elements):
 
     g.skel_name = str(g.skel_name.with_suffix("")) + "_debubbled.gsd"
     g.positions = np.asarray(np.where(g._skeleton_3d != 0)).T
-    with gsd.hoomd.open(name=g.skel_name, mode="w") as f:
-        s = gsd.hoomd.Frame()
-        s.particles.N = int(sum(g._skeleton_3d.ravel()))
-        s.particles.position = g.positions
-        s.particles.types = ["A"]
-        s.particles.typeid = ["0"] * s.particles.N
-        f.append(s)
     end = time.time()
-    print(
-        f"Ran debubble in {end - start} for an image with shape \
-        {g._skeleton_3d.shape}"
+    logger.info(
+        "Ran debubble in %.3f s for an image with shape %s",
+        end - start,
+        g._skeleton_3d.shape,
     )
 
     return g
@@ -380,18 +503,11 @@ def merge_nodes(g, disk_size):
     else:
         raise TypeError("Node merging not supported for 3D networks")
 
-    positions = np.asarray(np.where(g._skeleton_3d != 0)).T
-    with gsd.hoomd.open(name=g.skel_name, mode="w") as f:
-        s = gsd.hoomd.Frame()
-        s.particles.N = int(sum(g._skeleton_3d.ravel()))
-        s.particles.position = positions
-        s.particles.types = ["A"]
-        s.particles.typeid = ["0"] * s.particles.N
-        f.append(s)
     end = time.time()
-    print(
-        f"Ran merge in {end - start} for an image with shape \
-        {g._skeleton_3d.shape}"
+    logger.info(
+        "Ran merge in %.3f s for an image with shape %s",
+        end - start,
+        g._skeleton_3d.shape,
     )
 
     return g
@@ -409,18 +525,11 @@ def prune(g, size):
     else:
         g._skeleton_3d = np.asarray(g._skeleton)
 
-    positions = np.asarray(np.where(g._skeleton_3d != 0)).T
-    with gsd.hoomd.open(name=g.skel_name, mode="w") as f:
-        s = gsd.hoomd.Frame()
-        s.particles.N = int(sum(g._skeleton_3d.ravel()))
-        s.particles.position = positions
-        s.particles.types = ["A"]
-        s.particles.typeid = ["0"] * s.particles.N
-        f.append(s)
     end = time.time()
-    print(
-        f"Ran prune in {end - start} for an image with shape \
-        {g._skeleton_3d.shape}"
+    logger.info(
+        "Ran prune in %.3f s for an image with shape %s",
+        end - start,
+        g._skeleton_3d.shape,
     )
 
     return g
@@ -438,18 +547,11 @@ def remove_objects(g, size):
     else:
         g._skeleton_3d = np.asarray(g._skeleton)
 
-    positions = np.asarray(np.where(g._skeleton_3d != 0)).T
-    with gsd.hoomd.open(name=g.skel_name, mode="w") as f:
-        s = gsd.hoomd.Frame()
-        s.particles.N = int(sum(g._skeleton_3d.ravel()))
-        s.particles.position = positions
-        s.particles.types = ["A"]
-        s.particles.typeid = ["0"] * s.particles.N
-        f.append(s)
     end = time.time()
-    print(
-        f"Ran remove objects in {end - start} for an image with shape \
-        {g._skeleton_3d.shape}"
+    logger.info(
+        "Ran remove objects in %.3f s for an image with shape %s",
+        end - start,
+        g._skeleton_3d.shape,
     )
 
     return g
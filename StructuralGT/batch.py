@@ -0,0 +1,150 @@
+# Copyright (c) 2023-2024 The Regents of the University of Michigan.
+# This file is from the StructuralGT project, released under the BSD 3-Clause
+# License.
+
+import numbers
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from StructuralGT.networks import Network
+
+
+# The scalar results collected from each compute class. Properties are read
+# only by name, so array valued properties, some of which are expensive to
+# evaluate (e.g. :attr:`Electronic.Q`), are never calculated.
+_SCALAR_RESULTS = {
+    "Size": ("number_of_nodes", "number_of_edges", "diameter", "density"),
+    "Clustering": ("average_clustering_coefficient",),
+    "Assortativity": ("assortativity",),
+    "Closeness": ("average_closeness",),
+    "Degree": ("average_degree",),
+    "NodeBetweenness": ("average_node_betweenness",),
+    "Electronic": ("effective_resistance",),
+    "Nematic": ("nematic_order_parameter",),
+    "AverageNodalConnectivity": ("average_nodal_connectivity",),
+}
+
+
+def _scalar_results(compute):
+    """Returns the scalar results of a computed :class:`_Compute` object,
+    keyed by property name. Only the properties listed for its class in
+    :code:`_SCALAR_RESULTS` are read.
+    """
+    results = {}
+    for name in _SCALAR_RESULTS.get(type(compute).__name__, ()):
+        try:
+            value = getattr(compute, name)
+        except AttributeError:
+            continue
+        if isinstance(value, numbers.Number):
+            results[name] = value
+
+    return results
+
+
+def _run_one(
+    directory,
+    options,
+    network_kwargs,
+    img_to_skel_kwargs,
+    set_graph_kwargs,
+    computes,
+):
+    """Runs the full pipeline on a single directory. Exceptions are caught
+    and reported in the :code:`"error"` column of the returned row, so that
+    one failed directory does not stop the batch.
+    """
+    row = {"directory": str(directory), "error": None}
+    try:
+        network = Network(directory, **network_kwargs)
+        network.binarize(options=options)
+        network.img_to_skel(**img_to_skel_kwargs)
+        network.set_graph(**set_graph_kwargs)
+        for compute in computes:
+            if isinstance(compute, tuple):
+                compute, compute_kwargs = compute
+            else:
+                compute_kwargs = {}
+            module = compute()
+            module.compute(network, **compute_kwargs)
+            for name, value in _scalar_results(module).items():
+                row[compute.__name__ + "." + name] = value
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+
+    return row
+
+
+def run(
+    directories,
+    options="img_options.json",
+    computes=(),
+    network_kwargs=None,
+    img_to_skel_kwargs=None,
+    set_graph_kwargs=None,
+    workers=None,
+):
+    """Runs the full image to graph pipeline, followed by a list of compute
+    modules, on each of a list of image directories. Directories are
+    processed concurrently in a pool of processes, and the scalar results of
+    every compute module are collected in a single table.
+
+    Args:
+        directories (list[str]):
+            The image directories to analyse. Each is passed to
+            :class:`Network`.
+        options (dict or str, optional):
+            The binarization options passed to :meth:`Network.binarize`.
+        computes (list, optional):
+            The compute classes to run on each network, e.g.
+            :class:`StructuralGT.structural.Size`. A tuple of a class and a
+            dictionary of keyword arguments for its :code:`compute` method
+            may be given instead of a class.
+        network_kwargs (dict, optional):
+            Keyword arguments for the :class:`Network` constructor.
+        img_to_skel_kwargs (dict, optional):
+            Keyword arguments for :meth:`Network.img_to_skel`.
+        set_graph_kwargs (dict, optional):
+            Keyword arguments for :meth:`Network.set_graph`.
+        workers (int, optional):
+            The maximum number of directories processed at once. Defaults to
+            the number of processors. With :code:`1`, directories are
+            processed one at a time in the current process.
+
+    Returns:
+        :class:`pandas.DataFrame`: One row per directory, in the order
+        given, with a column for each scalar result named
+        :code:`<Class>.<property>`. Array valued results, such as
+        :attr:`Degree.degree`, are not collected. Directories which raised an exception
+        have the exception in the :code:`"error"` column, and no results.
+    """
+    args = (
+        options,
+        network_kwargs or {},
+        img_to_skel_kwargs or {},
+        set_graph_kwargs or {},
+        list(computes),
+    )
+    if workers == 1:
+        rows = [_run_one(directory, *args) for directory in directories]
+    else:
+        rows = [None] * len(directories)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_run_one, directory, *args): i
+                for i, directory in enumerate(directories)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    rows[i] = future.result()
+                except Exception as e:
+                    # The worker process itself failed, e.g. it ran out of
+                    # memory, so no row was returned.
+                    rows[i] = {
+                        "directory": str(directories[i]),
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+
+    return pd.DataFrame(rows)
@@ -2,20 +2,217 @@
 # This file is from the StructuralGT project, released under the BSD 3-Clause
 # License.
 
-import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
 
 from StructuralGT import base
 from StructuralGT.util import _Compute
 
+logger = logging.getLogger(__name__)
+
+# Writes connected skeletons off the critical path of compute, one at a
+# time so that files are completed in the order they were requested.
+_writer = ThreadPoolExecutor(max_workers=1)
+
+
+def _laplacian(graph, weights=None):
+    """Returns the Laplacian of a graph as a :class:`scipy.sparse.csr_matrix`,
+    without forming a dense matrix. Self-loops do not contribute to the
+    Laplacian, and are ignored.
+
+    Args:
+        graph (:class:`igraph.Graph`):
+            The graph.
+        weights (str, optional):
+            The edge attribute holding the edge weights.
+    """
+    n = graph.vcount()
+    edges = np.asarray(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    w = (
+        np.ones(len(edges))
+        if weights is None
+        else np.asarray(graph.es[weights], dtype=float)
+    )
+    loops = edges[:, 0] == edges[:, 1]
+    edges, w = edges[~loops], w[~loops]
+    i, j = edges.T
+    A = scipy.sparse.coo_matrix(
+        (
+            np.concatenate((w, w)),
+            (np.concatenate((i, j)), np.concatenate((j, i))),
+        ),
+        shape=(n, n),
+    ).tocsr()
+    degree = np.asarray(A.sum(axis=1)).ravel()
+
+    return (scipy.sparse.diags(degree) - A).tocsr()
+
+
+def _terminal_conductance(graph, R_j):
+    """Returns the conductance of the edges joining boundary nodes to the
+    source and sink, which is the mean conductance of the network edges, or
+    1 if junctions have infinite resistance."""
+    if R_j == "infinity":
+        return 1
+    weight_array = np.asarray(graph.es["Conductance"]).astype(float)
+    return np.mean(weight_array[~np.isnan(weight_array)])
+
+
+def _boundary_mask(centroids, axis, boundary):
+    """Returns a boolean mask of the nodes whose centroid lies within the
+    closed interval :code:`boundary` along :code:`axis`."""
+    coords = centroids[:, axis]
+    return (coords >= boundary[0]) & (coords <= boundary[1])
+
+
+def _block_size(n, memory=2**26):
+    """Returns the number of right-hand sides to solve for at once, such
+    that each dense :code:`(n, block)` array takes at most :code:`memory`
+    bytes. A solve holds a few such arrays at a time."""
+    return int(np.clip(memory // (8 * n), 1, 256))
+
+
+class _LaplacianSolver:
+    """Class which applies the pseudoinverse of a sparse graph Laplacian to
+    vectors, without forming the pseudoinverse.
+
+    One node of each connected component is grounded (its row and column
+    removed), which makes the reduced Laplacian positive definite. The
+    reduced system is either factorised once, or solved by conjugate
+    gradients with a Jacobi preconditioner. Solutions are then shifted to
+    zero mean on each component, which gives the same result as the
+    pseudoinverse.
+
+    Args:
+        L (:class:`scipy.sparse.csr_matrix`):
+            The graph Laplacian.
+        method (str, optional):
+            :code:`"direct"` for a sparse LU factorisation, or :code:`"cg"`
+            for preconditioned conjugate gradients.
+        rtol (float, optional):
+            The relative tolerance of the conjugate gradient solver.
+    """
+
+    def __init__(self, L, method="direct", rtol=1e-10):
+        if method not in ("direct", "cg"):
+            raise ValueError(f"Unknown solver {method}.")
+        self.n = L.shape[0]
+        self.method = method
+        self.rtol = rtol
+        _, self.labels = scipy.sparse.csgraph.connected_components(
+            L, directed=False
+        )
+        self.counts = np.bincount(self.labels)
+        # The first node of each component is grounded
+        grounded = np.zeros(self.n, dtype=bool)
+        grounded[np.unique(self.labels, return_index=True)[1]] = True
+        self.free = np.flatnonzero(~grounded)
+
+        reduced = L[self.free][:, self.free].tocsc()
+        if method == "direct":
+            self._lu = scipy.sparse.linalg.splu(reduced)
+        else:
+            self._reduced = reduced
+            diagonal = reduced.diagonal()
+            self._M = scipy.sparse.diags(1 / diagonal)
+
+    def _project(self, b):
+        """Subtracts the mean of each component from the rows of b."""
+        means = np.zeros((len(self.counts),) + b.shape[1:])
+        np.add.at(means, self.labels, b)
+        means /= self.counts.reshape((-1,) + (1,) * (b.ndim - 1))
+        return b - means[self.labels]
+
+    def solve(self, b):
+        """Returns :math:`L^+ b`, for a vector or for each column of a
+        matrix b."""
+        b = self._project(np.asarray(b, dtype=float))
+        x = np.zeros_like(b)
+        if self.method == "direct":
+            x[self.free] = self._lu.solve(b[self.free])
+        else:
+            rhs = b[self.free].reshape(len(self.free), -1)
+            solution = np.empty_like(rhs)
+            for k in range(rhs.shape[1]):
+                solution[:, k], info = scipy.sparse.linalg.cg(
+                    self._reduced, rhs[:, k], rtol=self.rtol, M=self._M
+                )
+                if info != 0:
+                    raise RuntimeError(
+                        "Conjugate gradient solver did not converge."
+                    )
+            x[self.free] = solution.reshape(b[self.free].shape)
+
+        return self._project(x)
+
+
+def _reduced_resistance(Q_KK, labels, nodes, source, sink, w):
+    """Returns the effective resistance between a source and a sink joined
+    by edges of conductance w to subsets of the boundary nodes.
+
+    With the sink grounded and unit current drawn from the source, the
+    currents c injected at the boundary nodes set their potentials to
+    :math:`x = Q c + \\gamma`, where :math:`\\gamma` is constant on each
+    connected component. Together with the current through each source and
+    sink edge and the conservation of current on each component, this gives
+    a small linear system for x, :math:`\\gamma` and the source potential,
+    which is the effective resistance.
+
+    Args:
+        Q_KK (:class:`numpy.ndarray`):
+            The pseudoinverse of the network Laplacian, restricted to all
+            boundary nodes.
+        labels (:class:`numpy.ndarray`):
+            The connected component of each boundary node.
+        nodes (:class:`numpy.ndarray`):
+            The positions in Q_KK of the nodes of this configuration.
+        source, sink (:class:`numpy.ndarray`):
+            Masks of the nodes which are connected to the source and sink.
+        w (float):
+            The conductance of the edges joining nodes to the source/sink.
+
+    Returns:
+        float: The effective resistance, which is infinite if no component
+        of the network touches both the source and the sink.
+    """
+    labels = labels[nodes]
+    if not np.intersect1d(labels[source], labels[sink]).size:
+        return np.inf
+    k = len(nodes)
+    _, component = np.unique(labels, return_inverse=True)
+    m = component.max() + 1
+    P = np.zeros((k, m))
+    P[np.arange(k), component] = 1
+    a = source.astype(float)
+    d = a + sink
+    Q = Q_KK[np.ix_(nodes, nodes)]
+
+    A = np.zeros((k + m + 1, k + m + 1))
+    A[:k, :k] = np.eye(k) + w * Q * d
+    A[:k, k : k + m] = -P
+    A[:k, -1] = -w * Q @ a
+    A[k : k + m, :k] = -P.T * d
+    A[k : k + m, -1] = P.T @ a
+    A[-1, :k] = -a
+    A[-1, -1] = a.sum()
+    b = np.zeros(k + m + 1)
+    b[-1] = 1 / w
+
+    return np.linalg.solve(A, b)[-1]
+
 
 class Electronic(_Compute):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
     def compute(self, network, R_j, axis, boundary_conditions, source=-1,
-                sink=-2):
+                sink=-2, solver="direct", write=True):
         """
         Args:
             network (:class:`Network`)
@@ -31,6 +228,28 @@ class Electronic(_Compute):
                 Source node id.
             sink (int, optional):
                 Sink node id.
+            solver (str, optional):
+                How the potentials are calculated. With :code:`"direct"`
+                (default) or :code:`"cg"`, the sparse Laplacian is solved by
+                a direct factorisation or by preconditioned conjugate
+                gradients, and :attr:`Q` is only calculated if it is
+                accessed. This scales to graphs with millions of nodes. With
+                :code:`"dense"`, the dense pseudoinverse :attr:`Q` of the
+                Laplacian is calculated immediately, which takes
+                :math:`O(N^3)` time and :math:`O(N^2)` memory. The Laplacian
+                is stored as :code:`network.L`, which is a
+                :class:`scipy.sparse.csr_matrix` with :code:`"direct"` or
+                :code:`"cg"`, and a dense :class:`numpy.ndarray` only with
+                :code:`"dense"`. Use :code:`network.L.toarray()` where a
+                dense array is needed.
+            write (bool or str, optional):
+                Whether to write the skeleton connected to the source and
+                sink to :code:`connected_<skel_name>`. With
+                :code:`"background"`, the file is written by a background
+                thread while the potentials are calculated, and
+                :attr:`write_future` is a
+                :class:`concurrent.futures.Future` which completes once the
+                file is written.
         """
         self.source = source
         self.sink = sink
@@ -38,22 +257,17 @@ class Electronic(_Compute):
         boundary1 = boundary_conditions[0]
         boundary2 = boundary_conditions[1]
         network.graph_connected = network.graph
-        if network.R_j != "infinity":
-            weight_array = np.asarray(
-                    network.graph.es["Conductance"]).astype(float)
-            weight_array = weight_array[~np.isnan(weight_array)]
-            weight_avg = np.mean(weight_array)
-        else:
+        weight_avg = _terminal_conductance(network.graph, network.R_j)
+        if network.R_j == "infinity":
             network.graph_connected.es["Conductance"] = \
                     np.ones(network.graph.ecount())
-            weight_avg = 1
 
         # Add source and sink nodes:
         source_id = max(network.graph_connected.vs).index + 1
         sink_id = source_id + 1
         network.graph_connected.add_vertices(2)
 
-        print("Graph has shape ", network.shape)
+        logger.info("Graph has shape %s", network.shape)
         axes = np.array([0, 1, 2])[0: network.dim]
         indices = axes[axes != axis]
         axis_centre1 = np.zeros(network.dim, dtype=int)
@@ -65,69 +279,194 @@ class Electronic(_Compute):
         axis_centre2[axis] = network.shape[axis]
         source_coord = axis_centre1 - delta
         sink_coord = axis_centre2 + delta
-        print("Source coordinate is ", source_coord)
-        print("Sink coordinate is ", sink_coord)
+        logger.info("Source coordinate is %s", source_coord)
+        logger.info("Sink coordinate is %s", sink_coord)
+
+        centroids = np.asarray(
+            network.graph_connected.vs[:source_id]["o"]
+        ).reshape(source_id, network.dim)
         network.graph_connected.vs[source_id]["o"] = source_coord
         network.graph_connected.vs[sink_id]["o"] = sink_coord
         network.graph_connected.vs[source_id]["pts"] = source_coord
         network.graph_connected.vs[sink_id]["pts"] = sink_coord
 
-        for node in network.graph_connected.vs:
-            if (node["o"][axis] >= boundary1[0]
-                    and node["o"][axis] <= boundary1[1]):
-                network.graph_connected.add_edges([(node.index, source_id)])
-                network.graph_connected.es[
-                    network.graph_connected.get_eid(node.index, source_id)
-                ]["Conductance"] = weight_avg
-                network.graph_connected.es[
-                    network.graph_connected.get_eid(node.index, source_id)
-                ]["pts"] = base.connector(source_coord, node["o"])
-            if (node["o"][axis] >= boundary2[0]
-                    and node["o"][axis] <= boundary2[1]):
-                network.graph_connected.add_edges([(node.index, sink_id)])
-                network.graph_connected.es[
-                    network.graph_connected.get_eid(node.index, sink_id)
-                ]["Conductance"] = weight_avg
-                network.graph_connected.es[
-                    network.graph_connected.get_eid(node.index, sink_id)
-                ]["pts"] = base.connector(sink_coord, node["o"])
+        # Wire every boundary node to the source/sink in a single call
+        source_nodes = np.flatnonzero(
+            _boundary_mask(centroids, axis, boundary1))
+        sink_nodes = np.flatnonzero(
+            _boundary_mask(centroids, axis, boundary2))
+        edges = np.concatenate((
+            np.column_stack((source_nodes, np.full_like(source_nodes,
+                                                        source_id))),
+            np.column_stack((sink_nodes, np.full_like(sink_nodes, sink_id))),
+        ))
+        network.graph_connected.add_edges(
+            edges.tolist(),
+            attributes={
+                "Conductance": [weight_avg] * len(edges),
+                "pts": (base.connectors(source_coord, centroids[source_nodes])
+                        + base.connectors(sink_coord, centroids[sink_nodes])),
+            },
+        )
 
         # Write skeleton connected to external node
         connected_name = (
             network.skel_name.parent
             / ("connected_" + str(network.skel_name.name))
         )
-        base.G_to_gsd(network.graph_connected, connected_name)
+        self._write_future = None
+        if write == "background":
+            # The frame is built now, as the graph is modified by later
+            # computes
+            self._write_future = _writer.submit(
+                base.write_frame,
+                base.G_to_frame(network.graph_connected),
+                connected_name,
+            )
+        elif write:
+            base.G_to_gsd(network.graph_connected, connected_name)
 
-        if network.R_j == "infinity":
-            network.L = np.asarray(network.graph.laplacian())
-        else:
-            network.L = np.asarray(network.graph.laplacian(
-                weights="Conductance"))
+        weights = None if network.R_j == "infinity" else "Conductance"
 
         F = np.zeros(sink_id + 1)
         F[source_id] = 1
         F[sink_id] = -1
 
-        Q = np.linalg.pinv(network.L, hermitian=True)
-        P = np.matmul(Q, F)
+        self._Q_cols = {}
+        if solver == "dense":
+            network.L = np.asarray(network.graph.laplacian(weights=weights))
+            Q = np.linalg.pinv(network.L, hermitian=True)
+            self._P = np.matmul(Q, F)
+            self._Q = Q
+            self._solver = None
+        else:
+            network.L = _laplacian(network.graph, weights=weights)
+            self._solver = _LaplacianSolver(network.L, method=solver)
+            self._P = self._solver.solve(F)
+            self._Q = None
+
+    def sweep(self, network, R_j, configurations, solver="direct",
+              block=None):
+        """Calculates the effective resistance for many source/sink
+        configurations of the same network. Unlike :meth:`compute`, the
+        network graph is not modified and no connected skeleton is written.
+
+        The Laplacian of the network is factorised once, and the columns of
+        its pseudoinverse belonging to every boundary node are found with a
+        single multiple right-hand side solve. Each configuration then only
+        requires a dense solve over its boundary nodes, so sweeping over
+        many axes and boundary windows costs little more than one call to
+        :meth:`compute`.
+
+        Args:
+            network (:class:`Network`)
+                The network to compute properties of.
+            R_j (float):
+                Resistance associated with the nanowire junction.
+            configurations (list):
+                The source/sink configurations, each an
+                :code:`(axis, boundary_conditions)` pair, with the same
+                meaning as the arguments of :meth:`compute`. E.g.
+                :code:`[(0, [[0,50],[950,1000]]), (1, [[0,50],[950,1000]])]`.
+            solver (str, optional):
+                :code:`"direct"`, :code:`"cg"` or :code:`"dense"`, as for
+                :meth:`compute`.
+            block (int, optional):
+                The number of columns of the pseudoinverse solved for at
+                once. By default, this is chosen so that each dense
+                right-hand side array takes at most 64 MiB.
+
+        Returns:
+            :class:`pandas.DataFrame`: One row per configuration, in the
+            order given, with the :code:`"axis"`, :code:`"source_boundary"`
+            and :code:`"sink_boundary"` of the configuration, the number of
+            nodes connected to the source and sink, and the
+            :code:`"effective_resistance"`. The effective resistance is
+            infinite if no path joins the source and sink.
+        """
+        weights = None if R_j == "infinity" else "Conductance"
+        w = _terminal_conductance(network.graph, R_j)
+        L = _laplacian(network.graph, weights=weights)
+        centroids = np.asarray(network.graph.vs["o"])
+
+        masks = []
+        for axis, boundary_conditions in configurations:
+            masks.append((
+                _boundary_mask(centroids, axis, boundary_conditions[0]),
+                _boundary_mask(centroids, axis, boundary_conditions[1]),
+            ))
+        boundary = np.zeros(len(centroids), dtype=bool)
+        for source_mask, sink_mask in masks:
+            boundary |= source_mask | sink_mask
+        K = np.flatnonzero(boundary)
+        position = np.full(len(centroids), -1)
+        position[K] = np.arange(len(K))
+
+        # Pseudoinverse restricted to the boundary nodes
+        if block is None:
+            block = _block_size(L.shape[0])
+        if solver == "dense":
+            Q = np.linalg.pinv(L.toarray(), hermitian=True)
+            Q_KK = Q[np.ix_(K, K)]
+        else:
+            laplacian_solver = _LaplacianSolver(L, method=solver)
+            Q_KK = np.empty((len(K), len(K)))
+            for start in range(0, len(K), block):
+                chunk = K[start : start + block]
+                E = np.zeros((L.shape[0], len(chunk)))
+                E[chunk, np.arange(len(chunk))] = 1
+                Q_KK[:, start : start + len(chunk)] = (
+                    laplacian_solver.solve(E)[K]
+                )
+        _, labels = scipy.sparse.csgraph.connected_components(
+            L, directed=False
+        )
 
-        self._P = P
-        self._Q = Q
+        rows = []
+        for (axis, boundary_conditions), (source_mask, sink_mask) in zip(
+            configurations, masks
+        ):
+            rows.append({
+                "axis": axis,
+                "source_boundary": list(boundary_conditions[0]),
+                "sink_boundary": list(boundary_conditions[1]),
+                "source_nodes": int(source_mask.sum()),
+                "sink_nodes": int(sink_mask.sum()),
+                "effective_resistance": _reduced_resistance(
+                    Q_KK,
+                    labels[K],
+                    position[source_mask | sink_mask],
+                    source_mask[source_mask | sink_mask],
+                    sink_mask[source_mask | sink_mask],
+                    w,
+                ),
+            })
+
+        return pd.DataFrame(rows)
 
     @_Compute._computed_property
     def effective_resistance(self):
         """Returns the effective resistance between the source and sink,
-        according to the method of :cite:`Klein1993`.
+        according to the method of :cite:`Klein1993`. Only the source and
+        sink columns of :attr:`Q` are calculated, with two linear solves.
 
         """
+        Q_source = self._Q_column(self.source)
+        Q_sink = self._Q_column(self.sink)
 
         return (
-            self.Q[self.source, self.source]
-            + self.Q[self.sink, self.sink]
-            - 2 * self.Q[self.source, self.sink]
+            Q_source[self.source]
+            + Q_sink[self.sink]
+            - 2 * Q_source[self.sink]
         )
 
+    @_Compute._computed_property
+    def write_future(self):
+        """:class:`concurrent.futures.Future`: The pending write of the
+        connected skeleton, if :meth:`compute` was called with
+        :code:`write="background"`, otherwise :code:`None`."""
+        return self._write_future
+
     @_Compute._computed_property
     def P(self):
         """:class:`np.ndarray`: The vector of potentials at each node."""
@@ -136,9 +475,59 @@ class Electronic(_Compute):
     @_Compute._computed_property
     def Q(self):
         """:class:`np.ndarray`: pseudoinverse of the graph Laplacian,
-        weighted by conductance. This property is immediately available if
-        :meth:`potential_distribution` has been called. Otherwise it may be
-        calculated by inverting the graph Laplacian, accessed via the
-        :meth:`laplacian` method of the :attr:`graph` attribute."""
+        weighted by conductance. Unless :meth:`compute` was called with
+        :code:`solver="dense"`, it is calculated column by column when first
+        accessed, which takes :math:`O(N^2)` memory. Use :meth:`Q_columns`
+        to stream columns instead."""
+        if self._Q is None:
+            n = len(self._P)
+            self._Q = np.column_stack(list(self.Q_columns(range(n))))
 
         return self._Q
+
+    def _Q_column(self, j):
+        """Returns column j of :attr:`Q`. Columns found by linear solves are
+        kept, so that each is solved for once."""
+        if self._Q is not None:
+            return self._Q[:, j]
+        j = j % len(self._P)
+        if j not in self._Q_cols:
+            e = np.zeros(len(self._P))
+            e[j] = 1
+            self._Q_cols[j] = self._solver.solve(e)
+        return self._Q_cols[j]
+
+    def Q_columns(self, indices, block=None):
+        """Yields columns of :attr:`Q`, the pseudoinverse of the graph
+        Laplacian, without forming the whole matrix. Columns are found by
+        linear solves with the Laplacian factorisation, :code:`block` at a
+        time.
+
+        Args:
+            indices (list[int]):
+                The node ids of the columns.
+            block (int, optional):
+                The number of columns solved for at once. By default, this is
+                chosen so that each dense right-hand side array takes at most
+                64 MiB.
+
+        Yields:
+            :class:`numpy.ndarray`: Each column of :attr:`Q`, in the order of
+            :code:`indices`.
+        """
+        if not self._called_compute:
+            raise AttributeError(
+                "Property not computed. Call compute first."
+            )
+        indices = list(indices)
+        n = len(self._P)
+        if block is None:
+            block = _block_size(n)
+        for start in range(0, len(indices), block):
+            chunk = indices[start : start + block]
+            if self._Q is not None:
+                yield from self._Q[:, chunk].T
+                continue
+            E = np.zeros((n, len(chunk)))
+            E[chunk, np.arange(len(chunk))] = 1
+            yield from self._solver.solve(E).T
@@ -4,26 +4,33 @@
 
 import copy
 import json
+import logging
 import os
-import time
 import warnings
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import cv2 as cv
 import freud
+import gsd.fl
 import gsd.hoomd
 import igraph as ig
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import scipy
 from matplotlib.colorbar import Colorbar
 from skimage.morphology import skeletonize
 
 from StructuralGT import base, error, process_image
-from StructuralGT.util import _cropper, _domain, _fname, _image_stack
+from StructuralGT.util import (_cropper, _domain, _graph_from_arrays,
+                               _graph_to_arrays, _gsd_graph, _image_stack,
+                               _point_store, _profiled, _slice_index,
+                               _stack_points, _stage_cache,
+                               _write_graph_lists)
+
+logger = logging.getLogger(__name__)
 
 
 def colorbar(mappable, ax, *args, **kwargs):
@@ -57,6 +64,14 @@ class Network:
             Default is "slice".
         dim (int, optional):
             The dimensionality of the network, either 2 or 3. Default is 2.
+        cache (bool, optional):
+            Whether to cache the outputs of :meth:`binarize`,
+            :meth:`img_to_skel` and :meth:`set_graph` in :attr:`stack_dir`.
+            Stages whose inputs and options are unchanged are then loaded
+            from the cache rather than recalculated.
+        cache_size (int, optional):
+            The maximum size of the cache, in bytes. The least recently used
+            entries are deleted when it is exceeded.
     """
 
     def __init__(
@@ -66,6 +81,8 @@ class Network:
         depth=None,
         prefix=None,
         dim=2,
+        cache=False,
+        cache_size=2**30,
     ):
         self.directory = Path(directory)
         self.binarized_dir = Path(binarized_dir)
@@ -98,6 +115,12 @@ class Network:
         )
         self.depth = depth
         self.dim = dim
+        self._profile_records = []
+        self._cache = (
+            _stage_cache(self.stack_dir / "cache", cache_size)
+            if cache
+            else None
+        )
         if self.dim == 2:
             self._2d = True
         else:
@@ -108,16 +131,20 @@ class Network:
         else:
             self.prefix = prefix
 
+        self.slice_index = _slice_index(
+            self.directory,
+            _2d=self._2d,
+            cache=self.stack_dir / "slice_index.json",
+        )
+        domain = _domain(depth)
         image_stack = _image_stack()
-        for slice_name in sorted(os.listdir(self.directory)):
-            if not base.Q_img(slice_name):
+        for slice_name in self.slice_index.names:
+            if not self._2d:
+                # Raises if the file name does not end in a slice number
+                self.slice_index.num(slice_name)
+            if prefix is not None and prefix not in Path(slice_name).stem:
                 continue
-            fname = _fname(
-                str(self.directory / slice_name),
-                domain=_domain(depth),
-                _2d=self._2d,
-            )
-            if dim == 2 and fname.isimg and prefix in fname:
+            if dim == 2:
                 if len(image_stack) != 0:
                     warnings.warn(
                         "You have specified a 2D network but there are \
@@ -127,21 +154,19 @@ class Network:
                         UserWarning,
                     )
                     break
-                _slice = plt.imread(self.directory / slice_name)
-                image_stack.append(_slice, slice_name)
-            if dim == 3 and fname.isinrange and fname.isimg and prefix in fname:
-                    _slice = plt.imread(self.directory / slice_name)
-                    image_stack.append(_slice, slice_name)
+                image_stack.append(self.directory / slice_name, slice_name)
+            if dim == 3 and self.slice_index.isinrange(slice_name, domain):
+                image_stack.append(self.directory / slice_name, slice_name)
 
         self.image_stack = image_stack
-        self.image_stack.package()
         if len(self.image_stack) == 0:
             raise error.ImageDirectoryError(
                 "There are no suitable images in the given directory. You \
                 may need to specify the prefix argument."
             )
 
-    def binarize(self, options="img_options.json"):
+    @_profiled("binarize", slices=lambda self: len(self.image_stack))
+    def binarize(self, options="img_options.json", workers=None):
         """Binarizes stack of experimental images using a set of image
         processing parameters.
 
@@ -151,9 +176,14 @@ class Network:
                 options must be specified. When this arguement is not
                 specified, the network's parent directory will be searched for
                 a file called :code:`img_options.json`, containing the options.
+            workers (int, optional):
+                The number of threads used to binarize slices concurrently.
+                Slices are processed one at a time by default. The binarized
+                stack and its file names do not depend on this argument.
         """
         if not self.stack_dir.is_dir():
             os.mkdir(self.stack_dir)
+        self.slice_index.save(self.stack_dir / "slice_index.json")
 
         self.options = options
         if isinstance(options, str):
@@ -173,19 +203,57 @@ class Network:
                     "tensorflow installed."
                 )
 
-        self.image_stack_bin = _image_stack()
-        for _, name in self.image_stack:
-            fname = _fname(str(self.directory / name), _2d=self._2d)
+        def _write(name, img_bin):
+            name_bin = self.stack_dir / (
+                self.prefix + self.slice_index.num(name) + ".tiff"
+            )
+            # Written uncompressed so that the slice can be memory-mapped
+            cv.imwrite(
+                str(name_bin), img_bin, [cv.IMWRITE_TIFF_COMPRESSION, 1]
+            )
+            return img_bin, name_bin
+
+        def _binarize(name):
             gray_image = cv.imread(self.directory / name, cv.IMREAD_GRAYSCALE)
             _, img_bin, _ = process_image.binarize(gray_image, options)
-            if self._2d:
-                fname.num = "0000"
-            name_bin = self.stack_dir / (self.prefix + fname.num + ".tiff")
+            return _write(name, img_bin)
+
+        names = self.image_stack.names
+        cached = None
+        if self._cache is not None:
+            self._binarize_key = self._cache.key(
+                options,
+                self.prefix,
+                [
+                    (name, _stage_cache.file_digest(self.directory / name))
+                    for name in names
+                ],
+            )
+            cached = self._cache.load("binarize", self._binarize_key)
+
+        self.image_stack_bin = _image_stack()
+        if cached is not None:
+            results = (
+                _write(name, cached[str(i)]) for i, name in enumerate(names)
+            )
+        elif workers is None or workers == 1:
+            results = map(_binarize, names)
+        else:
+            # OpenCV releases the GIL, so threads suffice. Executor.map
+            # returns results in the order of the image stack.
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_binarize, names))
+        for img_bin, name_bin in results:
             self.image_stack_bin.append(img_bin, name_bin)
-            plt.imsave(
-                name_bin,
-                img_bin,
-                cmap=mpl.cm.gray,
+
+        if self._cache is not None and cached is None:
+            self._cache.save(
+                "binarize",
+                self._binarize_key,
+                **{
+                    str(i): self.image_stack_bin[i][0]
+                    for i in range(len(names))
+                },
             )
 
         with open(self.stack_dir / "options.json", "w") as json_file:
@@ -194,7 +262,12 @@ class Network:
     def set_img_bin(self, crop):
         """Set the :attr:`img_bin` and :attr:`img_bin_3d` attributes.
 
-        This is called internally by subclasses of :class:`Network`.
+        This is called internally by subclasses of :class:`Network`. The
+        binarized images are taken from memory when :meth:`binarize` has been
+        called on this object, and are otherwise read from the
+        :attr:`stack_dir` written by a previous session. Once :attr:`img_bin`
+        is set, the binarized images are released from memory, and later
+        calls read them from :attr:`stack_dir`.
 
         Args:
             crop (list):
@@ -202,33 +275,21 @@ class Network:
                 rectangle which encloses the :class:`Network` region of
                 interest.
         """
+        self._load_image_stack_bin()
         self.cropper = _cropper(self, domain=crop)
+        # The binary image is held as a contiguous boolean array, with slices
+        # along the first axis, so that it can be skeletonized without a copy.
+        dims = self.cropper.dims
         if self._2d:
-            img_bin = np.zeros(self.cropper.dims)
+            img_bin = np.zeros(dims, dtype=bool)
         else:
-            img_bin = np.zeros(self.cropper.dims)
-            img_bin = np.swapaxes(img_bin, 0, 2)
-            img_bin = np.swapaxes(img_bin, 1, 2)
-
-        i = self.cropper.surface
-        # for fname in sorted(os.listdir(self.stack_dir)):
-        for _, name in self.image_stack_bin:
-            fname = _fname(
-                name,
-                domain=_domain(self.cropper._3d),
-                _2d=self._2d,
-            )
-            if fname.isimg and fname.isinrange:
-                img_bin[i - self.cropper.surface] = (
-                    base.read(
-                        self.stack_dir / (self.prefix + fname.num + ".tiff"),
-                        cv.IMREAD_GRAYSCALE,
-                    )[self.cropper._2d]
-                    / 255
-                )
-                i = i + 1
-            else:
-                continue
+            img_bin = np.zeros((dims[2], dims[0], dims[1]), dtype=bool)
+
+        # Only slices within the crop are decoded, and only the cropped rows
+        # of memory-mapped slices are read.
+        for i, k in enumerate(self._cropped_slices()):
+            img_bin[i] = self.image_stack_bin[k][0][self.cropper._2d] != 0
+        self._release_image_stack_bin()
 
         self._img_bin_3d = img_bin
         self._img_bin = img_bin
@@ -236,13 +297,125 @@ class Network:
         self._img_bin_3d = self._img_bin
         self._img_bin = np.squeeze(self._img_bin)
 
-        del self.image_stack_bin
+    def _load_image_stack_bin(self):
+        """Lists the binarized images written to :attr:`stack_dir` by a
+        previous session, if :meth:`binarize` has not been called on this
+        object. The images are only read when they are accessed."""
+        if hasattr(self, "image_stack_bin"):
+            return
+        self.image_stack_bin = _image_stack(read_type=cv.IMREAD_GRAYSCALE)
+        for name in self.image_stack.names:
+            name_bin = self.stack_dir / (
+                self.prefix + self.slice_index.num(name) + ".tiff"
+            )
+            self.image_stack_bin.append(name_bin, name_bin)
+
+    def _release_image_stack_bin(self):
+        """Replaces the binarized images held in memory by :meth:`binarize`
+        with their files in :attr:`stack_dir`, which are only read when they
+        are accessed."""
+        if hasattr(self, "image_stack_bin"):
+            del self.image_stack_bin
+        self._load_image_stack_bin()
+
+    def _binarized_key(self):
+        """Returns the cache key of the binarized stack. When :meth:`binarize`
+        has not been called on this object, the key is the hash of the
+        binarized images in :attr:`stack_dir`."""
+        if getattr(self, "_binarize_key", None) is None:
+            self._load_image_stack_bin()
+            self._binarize_key = self._cache.key(
+                [
+                    _stage_cache.file_digest(name)
+                    for name in self.image_stack_bin.names
+                ]
+            )
+        return self._binarize_key
+
+    def invalidate_cache(self, stage=None):
+        """Deletes cached stage outputs from :attr:`stack_dir`, so that they
+        are recalculated.
 
+        Args:
+            stage (str, optional):
+                The stage to invalidate, one of :code:`"binarize"`,
+                :code:`"img_to_skel"` or :code:`"set_graph"`. By default,
+                every stage is invalidated.
+        """
+        cache = self._cache or _stage_cache(self.stack_dir / "cache", 0)
+        cache.invalidate(stage)
+
+    def _cropped_slices(self):
+        """list[int]: Indices of the slices in the image stack which are
+        within the domain of the :attr:`cropper`."""
+        domain = _domain(self.cropper._3d)
+        return [
+            k
+            for k, name in enumerate(self.image_stack.names)
+            if self.slice_index.isinrange(name, domain)
+        ]
+
+    def _tiled_positions(self, tile, overlap, skeleton=True):
+        """Returns the positions of the skeleton voxels, calculated from
+        overlapping slabs of slices. Each slab is skeletonized with
+        :code:`overlap` slices of context either side of the :code:`tile`
+        slices it contributes, so that only one slab is held in memory at a
+        time.
+
+        The faces of a slab act as a boundary of the volume, so thinning
+        near them differs from thinning the whole stack. Neighbouring slabs
+        are compared on the :code:`overlap // 2` slices either side of their
+        seam, where both should match the untiled skeleton, and an error is
+        raised if they disagree.
+        """
+        indices = self._cropped_slices()
+        margin = overlap // 2
+        positions = []
+        ahead = behind = None
+        for start in range(0, len(indices), tile):
+            stop = min(start + tile, len(indices))
+            first = max(start - overlap, 0)
+            last = min(stop + overlap, len(indices))
+            slab = np.asarray(
+                [
+                    self.image_stack_bin[k][0][self.cropper._2d] != 0
+                    for k in indices[first:last]
+                ]
+            )
+            if skeleton:
+                slab = skeletonize(slab)
+                seam = start - first
+                if ahead is not None and not (
+                    np.array_equal(slab[seam : seam + len(ahead)], ahead)
+                    and np.array_equal(
+                        slab[seam - len(behind) : seam], behind
+                    )
+                ):
+                    raise error.InvalidArgumentsError(
+                        f"The skeletons of neighbouring slabs differ at slice \
+                        {start}, so the overlap of {overlap} slices is too \
+                        small for this network. Increase the overlap, or do \
+                        not tile."
+                    )
+                # The previous slab's skeleton either side of the next seam
+                ahead = slab[stop - first : min(stop + margin, last) - first]
+                behind = slab[max(stop - margin, start) - first : stop - first]
+            core = np.argwhere(slab[start - first : stop - first])
+            core[:, 0] += start
+            positions.append(core)
+
+        return np.concatenate(positions)
+
+    @_profiled(
+        "set_graph",
+        nodes=lambda self: self.Gr.vcount(),
+        edges=lambda self: self.Gr.ecount(),
+    )
     def set_graph(
         self, sub=True, weight_type=None, write="network.gsd", R_j=0, rho_dim=1
     ):
-        r"""Sets :class:`Graph` object as an attribute by reading the
-        skeleton file written by :meth:`img_to_skel`.
+        r"""Sets :class:`Graph` object as an attribute by extracting it from
+        the skeleton calculated by :meth:`img_to_skel`.
 
         Args:
             sub (optional, bool):
@@ -273,11 +446,53 @@ class Network:
                                  img_to_skel before calling set_graph."
             )
 
-        G = base.gsd_to_G(self.skel_name, _2d=self._2d, sub=sub)
+        graph_key = None
+        cached = None
+        if self._cache is not None and self._skel_key is not None:
+            graph_key = self._cache.key(
+                self._skel_key, sub, weight_type, R_j, rho_dim, self.rotate
+            )
+            cached = self._cache.load("set_graph", graph_key)
 
-        self.Gr = G
+        if cached is not None:
+            self.Gr, node_points, edge_points = _graph_from_arrays(cached)
+            self._set_points(node_points, edge_points)
+        else:
+            self._build_graph(sub, weight_type, R_j, rho_dim)
+            if graph_key is not None:
+                arrays = _graph_to_arrays(self.Gr, self.dim)
+                if arrays is not None:
+                    self._cache.save("set_graph", graph_key, **arrays)
         self.write_name = write
 
+        if weight_type is not None and "FixedWidthConductance" in weight_type:
+            weight_type.remove("FixedWidthConductance")
+            weight_type.append("Conductance")
+
+        self.shape = list(
+            max(list(self.Gr.vs[i]["o"][j] for i in range(self.Gr.vcount())))
+            for j in (0, 1, 2)[0 : self.dim]
+        )
+
+        if write:
+            self.node_labelling([], [], write, edge_weight=weight_type)
+
+    def _build_graph(self, sub, weight_type, R_j, rho_dim):
+        """Sets :attr:`graph` from the skeleton, applying any rotation and
+        edge weights."""
+        if self.skeleton_3d is None:
+            # img_to_skel was tiled, so only the skeleton positions are held
+            if weight_type is not None:
+                raise error.InvalidArgumentsError(
+                    "Edge weights require the binary image, which is not \
+                    kept when img_to_skel is tiled."
+                )
+            G = base.positions_to_G(self.positions, _2d=self._2d, sub=sub)
+        else:
+            G = base.skel_to_G(self.skeleton_3d, _2d=self._2d, sub=sub)
+
+        self.Gr = G
+
         if self.rotate is not None:
             centre = np.asarray(self.shape) / 2
             inner_length_x = (self.inner_cropper.dims[2]) * 0.5
@@ -344,18 +559,8 @@ class Network:
             self.Gr = base.add_weights(
                 self, weight_type=weight_type, rho_dim=rho_dim, R_j=R_j
             )
-            if "FixedWidthConductance" in weight_type:
-                weight_type.remove("FixedWidthConductance")
-                weight_type.append("Conductance")
-
-        self.shape = list(
-            max(list(self.Gr.vs[i]["o"][j] for i in range(self.Gr.vcount())))
-            for j in (0, 1, 2)[0 : self.dim]
-        )
-
-        if write:
-            self.node_labelling([], [], write, edge_weight=weight_type)
 
+    @_profiled("img_to_skel", voxels=lambda self: len(self.positions))
     def img_to_skel(
         self,
         name="skel.gsd",
@@ -367,8 +572,12 @@ class Network:
         merge_nodes=None,
         prune=None,
         remove_objects=None,
+        write=True,
+        tile=None,
+        overlap=16,
     ):
-        """Writes calculates and writes the skeleton to a :code:`.gsd` file.
+        """Calculates the skeleton and (optionally) writes it to a
+        :code:`.gsd` file.
 
         Note: if the rotation argument is given, this writes the union of all
         of the graph which can be obtained from cropping after rotation about
@@ -402,9 +611,48 @@ class Network:
             remove_objects (int):
                 The size of objects to remove from the skeleton, using the
                 algorithm in :cite:`Vecchio2021`.
+            write (bool):
+                Whether to write the skeleton to a :code:`.gsd` file.
+                :meth:`set_graph` does not read this file, so it may be
+                skipped when it is not needed.
+            tile (int, optional):
+                If given, the stack is skeletonized in slabs of this many
+                slices, rather than all at once, and the dense binary image
+                and skeleton are not kept. Peak memory is then bounded by the
+                slab size and the number of skeleton voxels, rather than the
+                volume, and each slab is read from the binarized images in
+                :attr:`stack_dir`. Only supported for 3D networks, without rotation or
+                skeleton post-processing.
+            overlap (int, optional):
+                The number of slices either side of each slab which are
+                included when it is skeletonized. Thinning near the faces of
+                a slab differs from thinning the whole stack, so the tiled
+                skeleton only matches the untiled one when the overlap is
+                large compared with the thickness of the features along the
+                stack axis, roughly twice their largest half-width. At least
+                2 slices are required. Neighbouring slabs are compared either
+                side of each seam, and
+                :class:`StructuralGT.error.InvalidArgumentsError` is raised if
+                they disagree, which shows that the overlap is too small.
         """
         if not self._2d and rotate is not None:
             raise ValueError("Cannot rotate 3D graphs.")
+        if tile is not None and (
+            self._2d
+            or any(
+                arg is not None
+                for arg in (debubble, merge_nodes, prune, remove_objects)
+            )
+        ):
+            raise error.InvalidArgumentsError(
+                "Tiling is only supported for 3D networks, without skeleton \
+                post-processing."
+            )
+        if tile is not None and skeleton and overlap < 2:
+            raise error.InvalidArgumentsError(
+                "Tiled skeletonization requires an overlap of at least 2 \
+                slices."
+            )
         if crop is None and rotate is not None:
             raise ValueError("If rotating a graph, crop must be specified")
         if crop is not None and self.depth is not None:
@@ -424,7 +672,6 @@ class Network:
                 data = json.load(json_file)
             self.options = data
 
-        start = time.time()
         skel_name = Path(name)
         self.skel_name = (
             skel_name
@@ -436,66 +683,129 @@ class Network:
             self.inner_cropper = _cropper(self, domain=crop)
             crop = self.inner_cropper._outer_crop
 
-        self.set_img_bin(crop)
-
-        if skeleton:
-            self._skeleton = skeletonize(
-                np.asarray(self._img_bin, dtype=np.dtype("uint8"))
-            )
-            self.skeleton_3d = skeletonize(
-                np.asarray(self._img_bin_3d, dtype=np.dtype("uint8"))
+        cached = None
+        self._skel_key = None
+        if self._cache is not None:
+            self._skel_key = self._cache.key(
+                self._binarized_key(),
+                crop,
+                skeleton,
+                debubble,
+                merge_nodes,
+                prune,
+                remove_objects,
+                tile,
+                overlap,
             )
+            cached = self._cache.load("img_to_skel", self._skel_key)
+
+        if tile is not None:
+            # Slabs are read from the binarized files, rather than from a
+            # stack held in memory by binarize
+            self._release_image_stack_bin()
+            self.cropper = _cropper(self, domain=crop)
+            if cached is None:
+                self.positions = self._tiled_positions(
+                    tile, overlap, skeleton
+                )
+            self._img_bin = self._img_bin_3d = None
+            self._skeleton = self.skeleton_3d = None
         else:
-            self._img_bin = np.asarray(self._img_bin)
-            self.skeleton_3d = self._img_bin_3d
-            self._skeleton = self._img_bin
+            self.set_img_bin(crop)
+
+            if cached is not None:
+                self._skeleton = cached["skeleton"]
+                self.skeleton_3d = cached["skeleton_3d"]
+            elif skeleton:
+                self._skeleton = skeletonize(self._img_bin)
+                self.skeleton_3d = skeletonize(self._img_bin_3d)
+            else:
+                self.skeleton_3d = self._img_bin_3d
+                self._skeleton = self._img_bin
+
+            self.positions = np.argwhere(self.skeleton_3d)
+
+        if cached is not None:
+            self.positions = cached["positions"]
+            if debubble is not None:
+                self.skel_name = (
+                    str(self.skel_name.with_suffix("")) + "_debubbled.gsd"
+                )
+            for step, value in (
+                ("debubble", debubble),
+                ("merge_nodes", merge_nodes),
+                ("prune", prune),
+                ("remove_objects", remove_objects),
+            ):
+                if value is not None:
+                    self.options[step] = value
+        else:
+            if debubble is not None:
+                self = base.debubble(self, debubble)
+                self.options["debubble"] = debubble
+                logger.debug(
+                    "Debubbled skeleton %s has %d voxels",
+                    self.skel_name,
+                    np.count_nonzero(self._skeleton_3d),
+                )
+
+            if merge_nodes is not None:
+                self = base.merge_nodes(self, merge_nodes)
+                self.options["merge_nodes"] = merge_nodes
+
+            if prune is not None:
+                self = base.prune(self, prune)
+                self.options["prune"] = prune
+
+            if remove_objects is not None:
+                self = base.remove_objects(self, remove_objects)
+                self.options["remove_objects"] = remove_objects
+
+            if any(
+                step is not None
+                for step in (debubble, merge_nodes, prune, remove_objects)
+            ):
+                self.skeleton_3d = self._skeleton_3d
+                self.positions = np.asarray(np.where(self.skeleton_3d != 0)).T
+
+            if self._cache is not None:
+                skeletons = (
+                    {}
+                    if tile is not None
+                    else {
+                        "skeleton": self._skeleton,
+                        "skeleton_3d": self.skeleton_3d,
+                    }
+                )
+                self._cache.save(
+                    "img_to_skel",
+                    self._skel_key,
+                    positions=self.positions,
+                    **skeletons,
+                )
 
-        self.positions = np.asarray(np.where(np.asarray(self.skeleton_3d) == 1)).T
         self.shape = np.asarray(
             list(max(self.positions.T[i]) + 1 for i in (2, 1, 0)[0 : self.dim])
         )
 
-        if debubble is not None:
-            self = base.debubble(self, debubble)
-            self.options["debubble"] = debubble
-            print(sum(self._skeleton_3d.ravel()))
-            print(self.skel_name)
-
-        if merge_nodes is not None:
-            self = base.merge_nodes(self, merge_nodes)
-            self.options["merge_nodes"] = merge_nodes
-
-        if prune is not None:
-            self = base.prune(self, prune)
-            self.options["prune"] = prune
-
-        if remove_objects is not None:
-            self = base.remove_objects(self, remove_objects)
-            self.options["remove_objects"] = remove_objects
-
-        with gsd.hoomd.open(name=self.skel_name, mode="w") as f:
-            s = gsd.hoomd.Frame()
-            s.particles.N = len(self.positions)
-            if box:
-                L = list(max(self.positions.T[i]) for i in (0, 1, 2))
-                s.particles.position, self.shift = base.shift(
-                    self.positions, _shift=(L[0] / 2, L[1] / 2, L[2] / 2)
-                )
-                s.configuration.box = [L[0], L[1], L[2], 0, 0, 0]
-            else:
-                s.particles.position, self.shift = base.shift(self.positions)
-            s.particles.types = ["A"]
-            s.particles.typeid = ["0"] * s.particles.N
-            f.append(s)
+        if box:
+            L = list(max(self.positions.T[i]) for i in (0, 1, 2))
+            positions, self.shift = base.shift(
+                self.positions, _shift=(L[0] / 2, L[1] / 2, L[2] / 2)
+            )
+        else:
+            positions, self.shift = base.shift(self.positions)
 
-        end = time.time()
-        print(
-            "Ran img_to_skel() in ",
-            end - start,
-            "for skeleton with ",
-            len(self.positions),
-            "voxels",
-        )
+        if write:
+            with gsd.hoomd.open(name=self.skel_name, mode="w") as f:
+                s = gsd.hoomd.Frame()
+                s.particles.N = len(positions)
+                s.particles.position = positions
+                if box:
+                    s.configuration.box = [L[0], L[1], L[2], 0, 0, 0]
+                s.particles.types = ["A"]
+                s.particles.typeid = ["0"] * s.particles.N
+                f.append(s)
 
         if rotate is not None:
             from scipy.spatial.transform import Rotation as R
@@ -506,6 +816,100 @@ class Network:
         else:
             self.rotate = None
 
+    def sweep(
+        self,
+        variants,
+        filename="sweep.gsd",
+        sub=True,
+        weight_type=None,
+        R_j=0,
+        rho_dim=1,
+    ):
+        """Extracts a graph for each of a list of binarization and
+        skeletonization parameters, and writes each graph as a frame of a
+        single :code:`.gsd` file. Each frame has the same layout as the file
+        written by :meth:`node_labelling`, so it may be read with
+        :meth:`from_gsd` by passing its frame number.
+
+        The stack is only binarized again when the binarization options
+        change, and the file is opened once for the whole sweep. Data which
+        is the same as in the first frame, such as the particle types, is
+        not repeated in later frames.
+
+        Args:
+            variants (list[dict]):
+                The parameters of each frame. Each dictionary holds keyword
+                arguments for :meth:`img_to_skel`, and optionally an
+                :code:`"options"` key holding the binarization options to
+                pass to :meth:`binarize`. Variants without this key reuse the
+                current binarization.
+            filename (str, optional):
+                The file name to write. The options of each frame, including
+                its binarization and skeleton post-processing options, are
+                written to a :code:`.json` file of the same name.
+            sub, weight_type, R_j, rho_dim (optional):
+                Arguments passed to :meth:`set_graph` for every variant.
+        """
+        filename = Path(filename)
+        save_name = (
+            filename if filename.is_absolute() else self.stack_dir / filename
+        )
+        # Skeleton post-processing options are set by img_to_skel, and must
+        # not carry over from one variant to the next
+        post_processing = ("debubble", "merge_nodes", "prune", "remove_objects")
+
+        def _without_post_processing(options):
+            return {
+                key: value
+                for key, value in options.items()
+                if key not in post_processing
+            }
+
+        base_options = _without_post_processing(getattr(self, "options", {}))
+        if not self.stack_dir.is_dir():
+            os.mkdir(self.stack_dir)
+        frames = []
+        binarized = None
+        with gsd.hoomd.open(name=save_name, mode="w") as f:
+            for variant in variants:
+                kwargs = dict(variant)
+                options = kwargs.pop("options", None)
+                if options is not None and options != binarized:
+                    self.binarize(options=options)
+                    binarized = options
+                if hasattr(self, "options"):
+                    self.options = _without_post_processing(self.options)
+                self.img_to_skel(write=False, **kwargs)
+
+                # set_graph renames weight types, so each call gets a copy
+                edge_weight = None if weight_type is None else list(weight_type)
+                self.set_graph(
+                    sub=sub,
+                    weight_type=edge_weight,
+                    write=False,
+                    R_j=R_j,
+                    rho_dim=rho_dim,
+                )
+                s, _ = self._labelled_frame([], [], edge_weight)
+                f.append(s)
+                frames.append(
+                    {**self.options, **kwargs, "cropper": str(self.cropper)}
+                )
+
+        options = {
+            **base_options,
+            **{
+                attr: str(getattr(self, attr))
+                for attr in ("stack_dir", "_2d", "dim", "cropper")
+            },
+            "frames": frames,
+        }
+        with open(
+            self.stack_dir / (filename.stem + ".json"), "w"
+        ) as json_file:
+            json.dump(options, json_file, default=str)
+
+    @_profiled("node_labelling", nodes=lambda self: self.Gr.vcount())
     def node_labelling(
         self,
         attributes,
@@ -513,7 +917,8 @@ class Network:
         filename="labelled.gsd",
         edge_weight=None,
         mode="w",
-        csv_write=True
+        csv_write=False,
+        npy_write=False,
     ):
         """Method saves a new :code:`.gsd` which labels the :attr:`graph`
         attribute with the given node attribute values. Method saves the
@@ -521,9 +926,12 @@ class Network:
         sparse adjacency matrix (therefore edge/node attributes are not saved).
 
         Args:
-            attributes (list[:class:`numpy.ndarray`]):
+            attributes (list[:class:`numpy.ndarray`] or dict):
                 A list of arrays of attribute values, with each array listing
-                attribute values in in ascending order of node id.
+                attribute values in in ascending order of node id. A 2D array,
+                with one row per label, is also accepted. Alternatively, a
+                dictionary mapping labels to arrays, in which case
+                :code:`labels` is ignored.
             label (list[str]):
                 A list of the labels to give the attribute in the file.
             filename (str):
@@ -531,12 +939,26 @@ class Network:
             edge_weight (optional, :class:`numpy.ndarray`):
                 Any edge weights to store in the adjacency matrix.
             mode (optional, str):
-                The writing mode. See the `gsd documentation <https://gsd.readthedocs.io/en/stable/python-module-gsd.hoomd.html#:~:text=Valid%20values%20for%20mode%3A>`__ for details.
+                The writing mode. With :code:`"w"`, a new file is written.
+                With :code:`"r+"`, if the file exists, the positions and
+                adjacency matrix already in it are kept and only the given
+                labels are added to, or replaced in, its frame.
+            csv_write (optional, bool):
+                Whether to also write the node centroids and edge list to
+                :code:`vertexPositions.csv` and :code:`edgeList.csv` in
+                :attr:`stack_dir`.
+            npy_write (optional, bool):
+                Whether to also write the node centroids and edge list to
+                binary :code:`vertexPositions.npy` and :code:`edgeList.npy`
+                files in :attr:`stack_dir`.
         """
         if isinstance(self.Gr, list):
             self.Gr = self.Gr[0]
 
-        if not isinstance(labels, list):
+        if isinstance(attributes, dict):
+            labels = list(attributes.keys())
+            attributes = list(attributes.values())
+        elif not isinstance(labels, list):
             labels = [
                 labels,
             ]
@@ -544,29 +966,56 @@ class Network:
                 attributes,
             ]
 
+        # All attributes are validated before any file is opened
+        Nv = self.Gr.vcount()
+        if len(labels) == 0:
+            attributes = np.empty((0, Nv))
+        else:
+            attributes = np.atleast_2d(np.asarray(attributes, dtype=float))
+        if attributes.shape != (len(labels), Nv):
+            raise ValueError(
+                f"Attributes have shape {attributes.shape}, which does not "
+                f"match {len(labels)} labels and {Nv} nodes."
+            )
+
         filename = Path(filename)
         save_name = (
             filename if filename.is_absolute() else self.stack_dir / filename
         )
-        _mode = "r+" if mode == "r+" and save_name.exists() else "w"
-
-        f = gsd.hoomd.open(name=save_name, mode=_mode)
         self.labelled_name = save_name
+        if mode == "r+" and save_name.exists():
+            self._append_node_labels(save_name, attributes, labels)
+            return
 
-        centroid_positions = np.empty((0, self.dim))
-        node_positions = np.empty((0, self.dim))
-        edge_positions = np.empty((0, self.dim))
-        for i in range(len(self.Gr.vs())):
-            node_positions = np.vstack(
-                (node_positions, self.Gr.vs()[i]["pts"])
-            )
-            centroid_positions = np.vstack(
-                (centroid_positions, self.Gr.vs()[i]["o"])
-            )
-        for i in range(len(self.Gr.es())):
-            edge_positions = np.vstack(
-                (edge_positions, self.Gr.es()[i]["pts"])
-            )
+        s, centroid_positions = self._labelled_frame(
+            attributes, labels, edge_weight
+        )
+        with gsd.hoomd.open(name=save_name, mode="w") as f:
+            f.append(s)
+
+        for attr in ("stack_dir", "_2d", "dim", "cropper"):
+            self.options[attr] = str(getattr(self, attr))
+
+        with open(
+            self.stack_dir / (filename.stem + ".json"), "w"
+        ) as json_file:
+            json.dump(self.options, json_file)
+
+        _write_graph_lists(
+            self.stack_dir,
+            centroid_positions,
+            self.graph,
+            csv=csv_write,
+            npy=npy_write,
+        )
+
+    def _labelled_frame(self, attributes, labels, edge_weight=None):
+        """Returns the :code:`.gsd` frame written by :meth:`node_labelling`,
+        along with the shifted node centroids.
+        """
+        node_positions = self.node_points.points.astype(float)
+        centroid_positions = _stack_points(self.Gr.vs["o"], self.dim)
+        edge_positions = self.edge_points.points.astype(float)
 
         if self._2d:
             node_positions = np.hstack(
@@ -604,23 +1053,17 @@ class Network:
         s.particles.N = N
         s.particles.position = positions
         s.particles.types = ["Edge", "Node", "Centroid"]
-        s.particles.typeid = np.array(
-            [
-                0,
-            ]
-            * len(edge_positions)
-            + [
-                1,
-            ]
-            * len(node_positions)
-            + [
-                2,
-            ]
-            * len(centroid_positions)
+        s.particles.typeid = np.repeat(
+            [0, 1, 2],
+            [len(edge_positions), len(node_positions), len(centroid_positions)],
         )
         s.configuration.box = [L[0] / 2, L[1] / 2, L[2] / 2, 0, 0, 0]
-        for label in labels:
-            s.log["particles/" + label] = [np.nan] * N
+
+        # Only centroid particles, which are last, are labelled
+        for attribute, label in zip(attributes, labels):
+            log = np.full(N, np.nan)
+            log[N - len(centroid_positions) :] = attribute
+            s.log["particles/" + label] = log
 
         matrix = self.Gr.get_adjacency_sparse(
             attribute=edge_weight[0] if edge_weight else None
@@ -631,39 +1074,33 @@ class Network:
         s.log["Adj_rows"] = rows
         s.log["Adj_cols"] = columns
         s.log["Adj_values"] = values
-        s.log["Edge_lens"] = list(
-            map(lambda edge: len(edge), self.Gr.es["pts"])
-        )
-        s.log["Node_lens"] = list(
-            map(lambda node: len(node), self.Gr.vs["pts"])
-        )
-
-        for i in range(len(centroid_positions)):
-            for attribute, label in zip(attributes, labels):
-                s.log["particles/" + label][
-                    len(node_positions) + len(edge_positions) + i
-                ] = attribute[i]
+        s.log["Edge_lens"] = self.edge_points.lens
+        s.log["Node_lens"] = self.node_points.lens
 
-        f.append(s)
+        return s, centroid_positions
 
-        for attr in ("stack_dir", "_2d", "dim", "cropper"):
-            self.options[attr] = str(getattr(self, attr))
-
-        with open(
-            self.stack_dir / (filename.stem + ".json"), "w"
-        ) as json_file:
-            json.dump(self.options, json_file)
-
-        if csv_write:
-            eds = self.graph.es
-            Ne = len(eds)
-            edgelist = np.array([[eds[n].source,eds[n].target] for n in range(Ne)])
-
-            df = pd.DataFrame(centroid_positions)
-            df.to_csv(self.stack_dir / 'vertexPositions.csv', header=False, index=False)
-            df = pd.DataFrame(edgelist)
-            df.to_csv(self.stack_dir / 'edgeList.csv', header=False, index=False)
+    def _append_node_labels(self, save_name, attributes, labels):
+        """Adds the given node labels to an existing labelled :code:`.gsd`
+        file. Positions, types and the adjacency matrix are read back from
+        the file rather than rebuilt from the graph, and the file is
+        rewritten as a single frame, so that it can be read by any
+        :code:`.gsd` reader.
+        """
+        with gsd.hoomd.open(name=save_name, mode="r") as f:
+            s = f[0]
+        centroids = s.particles.typeid == 2
+        if np.count_nonzero(centroids) != self.Gr.vcount():
+            raise ValueError(
+                f"{save_name} has {np.count_nonzero(centroids)} nodes, "
+                f"but the graph has {self.Gr.vcount()} nodes."
+            )
 
+        for attribute, label in zip(attributes, labels):
+            log = np.full(s.particles.N, np.nan)
+            log[centroids] = attribute
+            s.log["particles/" + label] = log
+        with gsd.hoomd.open(name=save_name, mode="w") as f:
+            f.append(s)
 
     def node_plot(self, parameter=None, ax=None, depth=0, plot_img=True):
         """Superimpose the skeleton, image, and nodal graph theory parameters.
@@ -876,6 +1313,62 @@ class Network:
         skeleton"""
         return self.Gr
 
+    @property
+    def profile(self):
+        """:class:`pandas.DataFrame`: The wall time, CPU time and peak memory
+        of each pipeline stage and compute module run on this network, with
+        the number of slices, skeleton voxels, nodes or edges it processed.
+        Rows are in the order the stages were run. Peak memory is the peak
+        resident memory of the process in bytes, at the end of the stage.
+        The same records are logged by the :code:`StructuralGT` logger at
+        :code:`INFO` level.
+        """
+        return pd.DataFrame(self._profile_records)
+
+    def compact_points(self):
+        """Stores the points of every node and edge of :attr:`graph` in the
+        flat :attr:`node_points` and :attr:`edge_points` arrays. The
+        :code:`"pts"` attribute of each node and edge is replaced by a view
+        into these arrays, so that the graph no longer owns one array per
+        element.
+        """
+        self._set_points(
+            _point_store.from_list(self.Gr.vs["pts"], self.dim),
+            _point_store.from_list(self.Gr.es["pts"], self.dim),
+        )
+        self.Gr.vs["pts"] = self._node_points.views()
+        self.Gr.es["pts"] = self._edge_points.views()
+
+    def _set_points(self, node_points, edge_points):
+        self._node_points = node_points
+        self._edge_points = edge_points
+        self._points_graph = self.Gr
+
+    def _points_current(self):
+        """Whether the point stores were built from the current graph. Stores
+        are rebuilt if the graph has since been replaced or resized."""
+        return (
+            getattr(self, "_points_graph", None) is self.Gr
+            and len(self._node_points) == self.Gr.vcount()
+            and len(self._edge_points) == self.Gr.ecount()
+        )
+
+    @property
+    def node_points(self):
+        """:class:`_point_store`: The points of every node of :attr:`graph`,
+        held in one flat array with an offsets array."""
+        if not self._points_current():
+            self.compact_points()
+        return self._node_points
+
+    @property
+    def edge_points(self):
+        """:class:`_point_store`: The points of every edge of :attr:`graph`,
+        held in one flat array with an offsets array."""
+        if not self._points_current():
+            self.compact_points()
+        return self._edge_points
+
     @property
     def image(self):
         """:class:`np.ndarray`: The original image used to obtain the graph."""
@@ -917,40 +1410,57 @@ class Network:
         _json = N.stack_dir / (filename.stem + ".json")
         with open(_json) as json_file:
             data = json.load(json_file)
+        # Files written by sweep record the options of each frame
+        if "frames" in data:
+            frames = data.pop("frames")
+            data.update(frames[frame])
         N.options = data
 
         N.cropper = _cropper.from_string(N, domain=data["cropper"])
         N.dim = int(data["dim"])
-        f = gsd.hoomd.open(name=filename, mode="r")[frame]
-        rows = f.log["Adj_rows"]
-        cols = f.log["Adj_cols"]
-        values = f.log["Adj_values"]
-        S = scipy.sparse.csr_matrix((values, (rows, cols)))
-        G = ig.Graph()
-        N.Gr = G.Weighted_Adjacency(S, mode="upper")
-
-        first_axis = {2: 1, 3: 0}[N.dim]
-        edge_pos = (
-            f.particles.position[f.particles.typeid == 0].T[first_axis:3].T
-        )
-        node_pos = (
-            f.particles.position[f.particles.typeid == 1].T[first_axis:3].T
-        )
-        centroid_pos = (
-            f.particles.position[f.particles.typeid == 2].T[first_axis:3].T
+        N.Gr, N.shape, node_points, edge_points = _read_network_gsd(
+            filename, frame, N.dim
         )
+        N._set_points(node_points, edge_points)
 
-        N.Gr.es["pts"] = base.split(
-            base.shift(edge_pos, _2d=N._2d)[0].astype(int), f.log["Edge_lens"]
-        )
-        N.Gr.vs["pts"] = base.split(
-            base.shift(node_pos, _2d=N._2d)[0].astype(int), f.log["Node_lens"]
-        )
-        N.Gr.vs["o"] = base.shift(centroid_pos, _2d=N._2d)[0].astype(int)
+        return N
 
-        N.shape = f.configuration.box[first_axis:3].astype(int)
 
-        return N
+def _read_network_gsd(filename, frame, dim):
+    """Reads the graph written by :meth:`Network.node_labelling`, with the
+    skeleton points of each node and edge and the node centroids shifted back
+    to image coordinates. The file is opened once. The :code:`"pts"`
+    attributes are views into the returned point stores.
+
+    Returns:
+        :class:`igraph.Graph`: The graph.
+        :class:`numpy.ndarray`: The shape of the image the graph was
+        extracted from.
+        :class:`_point_store`: The points of every node.
+        :class:`_point_store`: The points of every edge.
+    """
+    _2d = dim == 2
+    with gsd.hoomd.open(name=filename, mode="r") as f:
+        s = f[frame]
+    Gr, positions = _gsd_graph(s)
+
+    first_axis = {2: 1, 3: 0}[dim]
+    edge_pos, node_pos, centroid_pos = (
+        base.shift(pos[:, first_axis:3], _2d=_2d)[0].astype(int)
+        for pos in positions
+    )
+    node_points = _point_store(node_pos, s.log["Node_lens"])
+    edge_points = _point_store(edge_pos, s.log["Edge_lens"])
+    Gr.vs["pts"] = node_points.views()
+    Gr.es["pts"] = edge_points.views()
+    Gr.vs["o"] = centroid_pos
+
+    return (
+        Gr,
+        s.configuration.box[first_axis:3].astype(int),
+        node_points,
+        edge_points,
+    )
 
 
 def Graph(filename, frame=0):
@@ -969,16 +1479,9 @@ def Graph(filename, frame=0):
         (`igraph.Graph`): igraph Graph object.
     """
 
-    f = gsd.hoomd.open(name=filename, mode="r")[frame]
-    rows = f.log["Adj_rows"]
-    cols = f.log["Adj_cols"]
-    values = f.log["Adj_values"]
-    S = scipy.sparse.csr_matrix((values, (rows, cols)))
-    Gr = ig.Graph.Weighted_Adjacency(S, mode="upper")
-
-    edge_pos = f.particles.position[f.particles.typeid == 0]
-    node_pos = f.particles.position[f.particles.typeid == 1]
-    centroid_pos = f.particles.position[f.particles.typeid == 2]
+    with gsd.hoomd.open(name=filename, mode="r") as f:
+        s = f[frame]
+    Gr, (edge_pos, node_pos, centroid_pos) = _gsd_graph(s)
 
     Gr.es["pts"] = edge_pos
     Gr.vs["pts"] = node_pos
@@ -987,6 +1490,33 @@ def Graph(filename, frame=0):
     return Gr
 
 
+def read_labels(filename):
+    """Function reads the node labels in a :code:`.gsd` file written by
+    :meth:`Network.node_labelling`. Labels are merged across frames, so
+    that files holding more than one frame of labels are also read. Where a
+    label was written more than once, the latest values are returned.
+
+    Args:
+        filename (str):
+            The file name to read.
+
+    Returns:
+        dict: The attribute values of each label, in ascending order of node
+        id.
+    """
+    with gsd.fl.open(name=filename, mode="r") as f:
+        centroids = f.read_chunk(0, "particles/typeid") == 2
+        labels = {}
+        for name in f.find_matching_chunk_names("log/particles/"):
+            for frame in reversed(range(f.nframes)):
+                if f.chunk_exists(frame, name):
+                    values = f.read_chunk(frame, name)
+                    labels[name[len("log/particles/"):]] = values[centroids]
+                    break
+
+    return labels
+
+
 class GeometricGraph:
     """
 
@@ -1001,7 +1531,6 @@ class GeometricGraph:
     """
 
     def __init__(self, filename, frame=0):
-        f = gsd.hoomd.open(name=filename, mode="r")[frame]
         filename = Path(filename)
         _json = filename.parent / (filename.stem + ".json")
         with open(_json) as json_file:
@@ -1010,36 +1539,9 @@ class GeometricGraph:
         self.dim = int(data["dim"])
         self._2d = {2: True, 3: False}[self.dim]
         self.cropper_string = data["cropper"]  # Dubious about whether useful.
-        f = gsd.hoomd.open(name=filename, mode="r")[frame]
-        rows = f.log["Adj_rows"]
-        cols = f.log["Adj_cols"]
-        values = f.log["Adj_values"]
-        S = scipy.sparse.csr_matrix((values, (rows, cols)))
-        G = ig.Graph()
-        self.Gr = G.Weighted_Adjacency(S, mode="upper")
-
-        first_axis = {2: 1, 3: 0}[self.dim]
-        edge_pos = (
-            f.particles.position[f.particles.typeid == 0].T[first_axis:3].T
-        )
-        node_pos = (
-            f.particles.position[f.particles.typeid == 1].T[first_axis:3].T
+        self.Gr, self.shape, _, _ = _read_network_gsd(
+            filename, frame, self.dim
         )
-        centroid_pos = (
-            f.particles.position[f.particles.typeid == 2].T[first_axis:3].T
-        )
-
-        self.Gr.es["pts"] = base.split(
-            base.shift(edge_pos, _2d=self._2d)[0].astype(int),
-            f.log["Edge_lens"],
-        )
-        self.Gr.vs["pts"] = base.split(
-            base.shift(node_pos, _2d=self._2d)[0].astype(int),
-            f.log["Node_lens"],
-        )
-        self.Gr.vs["o"] = base.shift(centroid_pos, _2d=self._2d)[0].astype(int)
-
-        self.shape = f.configuration.box[first_axis:3].astype(int)
         self.graph = self.Gr
 
 
@@ -1223,7 +1725,13 @@ class PointNetwork:
         self.filename = filename
 
     def node_labelling(
-            self, attributes, labels, filename="labelled.gsd", csv_write=True):
+        self,
+        attributes,
+        labels,
+        filename="labelled.gsd",
+        csv_write=False,
+        npy_write=False,
+    ):
         """Method saves a new :code:`.gsd` which labels the :attr:`graph`
         attribute with the given node attribute values.
 
@@ -1235,6 +1743,14 @@ class PointNetwork:
                 A list of the labels to give the attribute in the file.
             filename (str):
                 The file name to write.
+            csv_write (optional, bool):
+                Whether to also write the positions and edge list to
+                :code:`vertexPositions.csv` and :code:`edgeList.csv`, in the
+                directory of :code:`filename`.
+            npy_write (optional, bool):
+                Whether to also write the positions and edge list to binary
+                :code:`vertexPositions.npy` and :code:`edgeList.npy` files,
+                in the directory of :code:`filename`.
         """
 
         filename = Path(filename)
@@ -1261,15 +1777,13 @@ class PointNetwork:
         s.log["dim"] = self.dim
         s.log["box"] = self.box
 
-        if csv_write:
-            eds = self.graph.es
-            Ne = len(eds)
-            edgelist = np.array([[eds[n].source,eds[n].target] for n in range(Ne)])
-
-            df = pd.DataFrame(self.positions)
-            df.to_csv(filename.parent / 'vertexPositions.csv', header=False, index=False)
-            df = pd.DataFrame(edgelist)
-            df.to_csv(filename.parent / 'edgeList.csv', header=False, index=False)
+        _write_graph_lists(
+            filename.parent,
+            self.positions,
+            self.graph,
+            csv=csv_write,
+            npy=npy_write,
+        )
 
         with gsd.hoomd.open(name=filename, mode="w") as f_mod:
             f_mod.append(s)
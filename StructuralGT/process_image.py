@@ -109,9 +109,6 @@ def binarize(source, options):
     wsize = int(options["wsize"])
     thresh = options["thresh"]
 
-    global img
-    global img_bin
-
     img = source
 
     img = adjust_gamma(img, gamma)
@@ -2,6 +2,9 @@
 # This file is from the StructuralGT project, released under the BSD 3-Clause
 # License.
 
+import shutil
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pytest
@@ -63,6 +66,19 @@ stick_options = {
 }
 
 
+@pytest.fixture(scope="session", autouse=True)
+def data_copy(tmp_path_factory):
+    """Runs the tests in a copy of the test data, so that the binarized
+    images, indices and graphs they write do not modify the tracked data."""
+    root = tmp_path_factory.mktemp("root")
+    shutil.copytree(
+        Path(_path) / "pytest/data", root / "StructuralGT/pytest/data"
+    )
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(root)
+        yield root
+
+
 @pytest.fixture(scope="session")
 def fibrous(weight_type=None):
     ANF = Network("StructuralGT/pytest/data/ANF", prefix="slice", dim=3)
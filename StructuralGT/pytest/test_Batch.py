@@ -0,0 +1,71 @@
+# Copyright (c) 2023-2024 The Regents of the University of Michigan.
+# This file is from the StructuralGT project, released under the BSD 3-Clause
+# License.
+
+import numpy.testing as npt
+import pandas as pd
+import pytest
+from conftest import agnwn_options
+
+from StructuralGT import batch
+from StructuralGT.electronic import Electronic
+from StructuralGT.networks import Network
+from StructuralGT.structural import Size
+
+AgNWN_path = "StructuralGT/pytest/data/AgNWN"
+img_to_skel_kwargs = {"crop": [0, 500, 0, 500], "write": False}
+set_graph_kwargs = {"write": False}
+
+
+class TestBatch:
+    @pytest.fixture
+    def network_kwargs(self, tmp_path):
+        return {"prefix": "slice", "binarized_dir": str(tmp_path)}
+
+    @pytest.fixture
+    def reference(self, network_kwargs):
+        testNetwork = Network(AgNWN_path, **network_kwargs)
+        testNetwork.binarize(options=agnwn_options)
+        testNetwork.img_to_skel(**img_to_skel_kwargs)
+        testNetwork.set_graph(**set_graph_kwargs)
+
+        ComputeModule = Size()
+        ComputeModule.compute(testNetwork)
+
+        return ComputeModule
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_run(self, reference, network_kwargs, workers):
+        table = batch.run(
+            ["StructuralGT/pytest/data/Missing", AgNWN_path],
+            options=agnwn_options,
+            computes=[Size],
+            network_kwargs=network_kwargs,
+            img_to_skel_kwargs=img_to_skel_kwargs,
+            set_graph_kwargs=set_graph_kwargs,
+            workers=workers,
+        )
+
+        assert len(table) == 2
+        assert table["error"][0].startswith("FileNotFoundError")
+        assert pd.isna(table["error"][1])
+        assert table["Size.number_of_nodes"][1] == reference.number_of_nodes
+        npt.assert_allclose(table["Size.density"][1], reference.density)
+
+    def test_scalar_results(self, conductive):
+        ComputeModule = Electronic()
+        ComputeModule.compute(
+            conductive,
+            10,
+            0,
+            [[0, 50], [conductive.shape[0] - 50, conductive.shape[0]]],
+        )
+
+        results = batch._scalar_results(ComputeModule)
+        assert list(results) == ["effective_resistance"]
+        npt.assert_allclose(
+            results["effective_resistance"],
+            ComputeModule.effective_resistance,
+        )
+        # The dense pseudoinverse is never built
+        assert ComputeModule._Q is None
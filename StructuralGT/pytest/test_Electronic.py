@@ -2,16 +2,21 @@
 # This file is from the StructuralGT project, released under the BSD 3-Clause
 # License.
 
+import copy
+
+import gsd.hoomd
+import numpy as np
 import numpy.testing as npt
 import pytest
+import scipy.sparse
 
 import StructuralGT
-from StructuralGT.electronic import Electronic
+from StructuralGT.electronic import Electronic, _block_size
 
 
 class TestElectronic:
-    @pytest.fixture
-    def test_compute(self, conductive):
+    @pytest.fixture(params=["direct", "cg", "dense"])
+    def test_compute(self, conductive, request):
         # Obtain a conductive graph
         testNetwork = conductive
 
@@ -22,6 +27,7 @@ class TestElectronic:
             10,
             0,
             [[0, 50], [testNetwork.shape[0] - 50, testNetwork.shape[0]]],
+            solver=request.param,
         )
 
         return ComputeModule
@@ -36,3 +42,126 @@ class TestElectronic:
             1,
             atol=1e-2,
         )
+
+    def test_dense_agreement(self, test_compute, conductive):
+        # Sparse solutions should match the dense pseudoinverse
+        ComputeModule = test_compute
+        L = conductive.L
+        if scipy.sparse.issparse(L):
+            L = L.toarray()
+        npt.assert_allclose(
+            L,
+            np.asarray(conductive.graph.laplacian(weights="Conductance")),
+            atol=1e-8,
+        )
+
+        Q = np.linalg.pinv(L, hermitian=True)
+        F = np.zeros(len(L))
+        F[-2] = 1
+        F[-1] = -1
+        npt.assert_allclose(ComputeModule.P, Q @ F, rtol=1e-5, atol=1e-8)
+        npt.assert_allclose(
+            ComputeModule.effective_resistance,
+            Q[-1, -1] + Q[-2, -2] - 2 * Q[-1, -2],
+            rtol=1e-5,
+        )
+
+    def test_lazy_Q(self, test_compute, conductive):
+        ComputeModule = test_compute
+        L = conductive.L
+        if scipy.sparse.issparse(L):
+            assert ComputeModule._Q is None
+            L = L.toarray()
+        Q = np.linalg.pinv(L, hermitian=True)
+
+        columns = [0, len(L) // 2, -1]
+        for j, column in zip(columns, ComputeModule.Q_columns(columns)):
+            npt.assert_allclose(column, Q[:, j], rtol=1e-5, atol=1e-8)
+        npt.assert_allclose(ComputeModule.Q, Q, rtol=1e-5, atol=1e-8)
+
+        # Small blocks give the same columns
+        for j, column in zip(columns, ComputeModule.Q_columns(columns, 2)):
+            npt.assert_allclose(column, Q[:, j], rtol=1e-5, atol=1e-8)
+
+    def test_block_size(self):
+        assert _block_size(100) == 256
+        assert 8 * 10**6 * _block_size(10**6) <= 2**26
+        assert _block_size(10**9) == 1
+
+    @pytest.mark.parametrize("solver", ["direct", "cg", "dense"])
+    def test_sweep(self, conductive, solver):
+        # Batched configurations should match individual computes
+        configurations = [
+            (0, [[0, 50], [conductive.shape[0] - 50, conductive.shape[0]]]),
+            (1, [[0, 50], [conductive.shape[1] - 50, conductive.shape[1]]]),
+            (0, [[0, 100], [conductive.shape[0] - 50, conductive.shape[0]]]),
+            (0, [[-3, -1], [conductive.shape[0] - 50, conductive.shape[0]]]),
+        ]
+        table = Electronic().sweep(conductive, 10, configurations,
+                                   solver=solver)
+
+        assert len(table) == len(configurations)
+        assert table["source_nodes"][3] == 0
+        assert np.isinf(table["effective_resistance"][3])
+        for i, (axis, boundary_conditions) in enumerate(configurations[:3]):
+            network = copy.copy(conductive)
+            network.Gr = conductive.graph.copy()
+            ComputeModule = Electronic()
+            ComputeModule.compute(network, 10, axis, boundary_conditions)
+            npt.assert_allclose(
+                table["effective_resistance"][i],
+                ComputeModule.effective_resistance,
+                rtol=1e-5,
+            )
+
+    def test_write(self, conductive):
+        network = copy.copy(conductive)
+        network.Gr = conductive.graph.copy()
+        connected_name = (
+            network.skel_name.parent
+            / ("connected_" + str(network.skel_name.name))
+        )
+        boundary_conditions = [
+            [0, 50], [network.shape[0] - 50, network.shape[0]]
+        ]
+
+        connected_name.unlink(missing_ok=True)
+        ComputeModule = Electronic()
+        ComputeModule.compute(network, 10, 0, boundary_conditions,
+                              write=False)
+        assert ComputeModule.write_future is None
+        assert not connected_name.exists()
+
+        ComputeModule.compute(network, 10, 0, boundary_conditions,
+                              write="background")
+        ComputeModule.write_future.result()
+        with gsd.hoomd.open(connected_name) as f:
+            s = f[0]
+        G = network.graph_connected
+        assert s.particles.N == G.vcount() + sum(
+            len(pts) for pts in G.es["pts"]
+        )
+
+    def test_empty_boundary(self, conductive):
+        # No nodes lie in the source window, so only the sink is wired
+        network = copy.copy(conductive)
+        network.Gr = conductive.graph.copy()
+        sink_id = network.graph.vcount() + 1
+        ComputeModule = Electronic()
+        ComputeModule.compute(
+            network,
+            10,
+            0,
+            [[-30, -20], [network.shape[0] - 50, network.shape[0]]],
+            write=False,
+        )
+
+        G = network.graph_connected
+        assert G.degree(sink_id - 1) == 0
+        sink_edges = G.es.select(_incident=[sink_id])
+        assert len(sink_edges) > 0
+        for edge in sink_edges:
+            node = edge.source if edge.target == sink_id else edge.target
+            npt.assert_array_equal(
+                edge["pts"][-1], np.asarray(G.vs[node]["o"]).astype(int)
+            )
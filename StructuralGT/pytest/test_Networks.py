@@ -6,14 +6,21 @@ import os
 import shutil
 from pathlib import Path
 
+import gsd.hoomd
+import igraph as ig
+import matplotlib.pyplot as plt
 import numpy as np
+import numpy.testing as npt
 import options
 import pandas as pd
 import pytest
+import scipy
 
 import StructuralGT
-from StructuralGT import error
-from StructuralGT.networks import Graph, Network, PointNetwork
+from StructuralGT import base, error
+from StructuralGT.networks import Graph, Network, PointNetwork, read_labels
+from StructuralGT.structural import Size
+from StructuralGT.util import _slice_index
 
 Small_path = "StructuralGT/pytest/data/Small/"
 AgNWN_path = "StructuralGT/pytest/data/AgNWN/"
@@ -22,8 +29,6 @@ PointNetwork_path = "StructuralGT/pytest/data/Seeds/"
 EdgeList_path = "StructuralGT/pytest/data/Bonds/"
 img_path = "StructuralGT/pytest/data/loose_img.tiff"
 
-_path = Path(StructuralGT.__path__[0])
-out_path = _path / "pytest/data/out_dir"
 
 class TestNetwork:
     def test_3d_constructor(self):
@@ -40,6 +45,58 @@ class TestNetwork:
         # return testNetwork
         # uncomment if 3D network becomes required as a fixture in other tests
 
+    def test_lazy_image_stack(self):
+        testNetwork = Network(ANF_path, dim=3, prefix="slice")
+        name = testNetwork.image_stack.names[0]
+        assert isinstance(testNetwork.image_stack._images[0], Path)
+
+        npt.assert_array_equal(
+            testNetwork.image_stack[0][0], plt.imread(Path(ANF_path) / name)
+        )
+
+    def test_slice_index(self, tmp_path):
+        testNetwork = Network(ANF_path, dim=3, binarized_dir=tmp_path)
+        testNetwork.binarize(options=options.anf)
+        assert (tmp_path / "slice_index.json").exists()
+
+        index = _slice_index(ANF_path, cache=tmp_path / "slice_index.json")
+        assert index.names == testNetwork.slice_index.names
+        assert index.path(281) == Path(ANF_path) / "slice0281.tif"
+
+        # A stale index is rebuilt from the directory
+        index._mtime = 0
+        index.names = []
+        index.save(tmp_path / "slice_index.json")
+        index = _slice_index(ANF_path, cache=tmp_path / "slice_index.json")
+        assert index.names == testNetwork.slice_index.names
+
+    def test_slice_index_first_run(self, tmp_path, monkeypatch):
+        for i in range(281, 285):
+            shutil.copy(ANF_path + f"slice{i:04d}.tif", tmp_path)
+        testNetwork = Network(tmp_path, dim=3)
+        testNetwork.binarize(options=options.anf)
+
+        # Creating the binarized directory does not make the index stale
+        def fail(self):
+            raise AssertionError("Slice index was rebuilt")
+
+        monkeypatch.setattr(_slice_index, "_scan", fail)
+        resumedNetwork = Network(tmp_path, dim=3)
+        names = testNetwork.slice_index.names
+        assert resumedNetwork.slice_index.names == names
+
+    def test_3d_parallel_binarize(self, tmp_path):
+        testNetwork = Network(ANF_path, dim=3, binarized_dir=tmp_path)
+        testNetwork.binarize(options=options.anf)
+        serial = list(testNetwork.image_stack_bin)
+
+        testNetwork.binarize(options=options.anf, workers=4)
+        parallel = list(testNetwork.image_stack_bin)
+
+        assert [name for _, name in serial] == [name for _, name in parallel]
+        for (img_bin, _), (_img_bin, _) in zip(serial, parallel):
+            npt.assert_array_equal(img_bin, _img_bin)
+
     @pytest.fixture
     def test_2d_constructor(self):
         with pytest.raises(error.ImageDirectoryError):
@@ -79,6 +136,16 @@ class TestNetwork:
 
         return testNetwork
 
+    @pytest.fixture
+    def tmp_crop(self, tmp_path):
+        testNetwork = Network(
+            AgNWN_path, prefix="slice", binarized_dir=tmp_path
+        )
+        testNetwork.binarize(options=options.agnwn)
+        testNetwork.img_to_skel(crop=[0, 500, 0, 500])
+
+        return testNetwork
+
     def test_rotations(self, test_2d_binarize):
         testNetwork = test_2d_binarize
         testNetwork.img_to_skel(crop=[149, 868, 408, 1127], rotate=45)
@@ -92,6 +159,304 @@ class TestNetwork:
             write=False,
         )
 
+    def test_in_memory_graph(self, tmp_crop):
+        testNetwork = tmp_crop
+        G = base.skel_to_G(testNetwork.skeleton_3d, _2d=True)
+        _G = base.gsd_to_G(testNetwork.skel_name, _2d=True)
+
+        assert G.get_edgelist() == _G.get_edgelist()
+        npt.assert_array_equal(G.vs["o"], _G.vs["o"])
+
+    def test_3d_in_memory_graph(self, tmp_path):
+        testNetwork = Network(ANF_path, dim=3, binarized_dir=tmp_path)
+        testNetwork.binarize(options=options.anf)
+        testNetwork.img_to_skel(crop=[200, 300, 200, 300, 281, 288])
+        G = base.skel_to_G(testNetwork.skeleton_3d)
+        _G = base.gsd_to_G(testNetwork.skel_name)
+
+        assert G.get_edgelist() == _G.get_edgelist()
+        npt.assert_array_equal(G.vs["o"], _G.vs["o"])
+
+    @pytest.fixture
+    def tubes(self, tmp_path):
+        # Thin tubes through a 40 slice stack, which cross every slab seam
+        z, y, x = np.mgrid[0:40, 0:64, 0:64]
+        volume = (
+            ((x - 20) ** 2 + (y - 20) ** 2 <= 2)
+            | ((x - 10 - z) ** 2 + (y - 45) ** 2 <= 2)
+            | ((z - 21) ** 2 + (y - 32) ** 2 <= 2)
+            | ((x - 50) ** 2 + (y - 10 - z // 2) ** 2 <= 2)
+        )
+        (tmp_path / "Binarized").mkdir()
+        with open(tmp_path / "Binarized" / "options.json", "w") as f:
+            f.write("{}")
+        for i, img in enumerate(volume.astype(np.uint8) * 255):
+            plt.imsave(tmp_path / f"slice{i:04d}.png", img, cmap="gray")
+            plt.imsave(
+                tmp_path / "Binarized" / f"slice{i:04d}.tiff", img, cmap="gray"
+            )
+
+        return tmp_path
+
+    @pytest.mark.parametrize(
+        "skeleton, tile, overlap", [(False, 7, 0), (True, 8, 6), (True, 5, 8)]
+    )
+    def test_tiled_img_to_skel(self, tubes, skeleton, tile, overlap):
+        crop = [0, 64, 0, 64, 0, 40]
+        testNetwork = Network(tubes, dim=3)
+        testNetwork.img_to_skel(crop=crop, skeleton=skeleton, write=False)
+        testNetwork.set_graph(write=False)
+
+        tiledNetwork = Network(tubes, dim=3)
+        tiledNetwork.img_to_skel(
+            crop=crop,
+            skeleton=skeleton,
+            write=False,
+            tile=tile,
+            overlap=overlap,
+        )
+        tiledNetwork.set_graph(write=False)
+
+        # Every slab is smaller than the stack, so the seams are exercised
+        assert tile + 2 * overlap < crop[5] - crop[4]
+        assert tiledNetwork.skeleton_3d is None
+        npt.assert_array_equal(testNetwork.positions, tiledNetwork.positions)
+        assert (
+            testNetwork.graph.get_edgelist()
+            == tiledNetwork.graph.get_edgelist()
+        )
+        npt.assert_array_equal(
+            testNetwork.graph.vs["o"], tiledNetwork.graph.vs["o"]
+        )
+
+    @pytest.mark.parametrize("overlap", [0, 2])
+    def test_tiled_overlap_too_small(self, tmp_path, overlap):
+        # ANF fibres are thick compared with the slabs, so the skeletons of
+        # neighbouring slabs disagree at their seams
+        testNetwork = Network(ANF_path, dim=3, binarized_dir=tmp_path)
+        testNetwork.binarize(options=options.anf)
+        with pytest.raises(error.InvalidArgumentsError):
+            testNetwork.img_to_skel(
+                crop=[0, 600, 0, 600, 281, 292],
+                write=False,
+                tile=4,
+                overlap=overlap,
+            )
+        if overlap >= 2:
+            # Slabs were read from the binarized files, not from memory
+            assert all(
+                isinstance(name, Path)
+                for name in testNetwork.image_stack_bin._images
+            )
+
+    def test_node_labelling(self, tmp_crop):
+        testNetwork = tmp_crop
+        testNetwork.set_graph(write=False)
+        degree = np.asarray(testNetwork.graph.degree())
+        testNetwork.node_labelling(
+            {"Degree": degree, "ID": np.arange(len(degree))}, None
+        )
+
+        with gsd.hoomd.open(testNetwork.labelled_name) as f:
+            s = f[0]
+        centroids = s.particles.typeid == 2
+        npt.assert_array_equal(s.log["particles/Degree"][centroids], degree)
+        assert np.isnan(s.log["particles/ID"][~centroids]).all()
+
+        with pytest.raises(ValueError):
+            testNetwork.node_labelling([degree[1:]], ["Degree"])
+
+    def test_append_labels(self, tmp_crop):
+        testNetwork = tmp_crop
+        testNetwork.set_graph(write=False)
+        degree = np.asarray(testNetwork.graph.degree(), dtype=float)
+        testNetwork.node_labelling(degree, "Degree", "appended.gsd")
+        size = testNetwork.labelled_name.stat().st_size
+
+        testNetwork.node_labelling(
+            2 * degree, "Double", "appended.gsd", mode="r+"
+        )
+        testNetwork.node_labelling(
+            3 * degree, "Triple", "appended.gsd", mode="r+"
+        )
+        testNetwork.node_labelling(
+            4 * degree, "Degree", "appended.gsd", mode="r+"
+        )
+
+        labels = read_labels(testNetwork.labelled_name)
+        npt.assert_array_equal(labels["Double"], 2 * degree)
+        npt.assert_array_equal(labels["Triple"], 3 * degree)
+        npt.assert_array_equal(labels["Degree"], 4 * degree)
+        with gsd.hoomd.open(testNetwork.labelled_name) as f:
+            assert len(f) == 1
+            for i in range(len(f)):
+                s = f[i]
+                assert s.particles.N > testNetwork.graph.vcount()
+                centroids = s.particles.typeid == 2
+                npt.assert_array_equal(
+                    s.log["particles/Double"][centroids], 2 * degree
+                )
+                npt.assert_array_equal(
+                    s.log["particles/Triple"][centroids], 3 * degree
+                )
+                npt.assert_array_equal(
+                    s.log["particles/Degree"][centroids], 4 * degree
+                )
+        assert testNetwork.labelled_name.stat().st_size < 2 * size
+
+    def test_compact_points(self, tmp_crop):
+        testNetwork = tmp_crop
+        testNetwork.set_graph(write=False)
+        edge_pts = [np.copy(pts) for pts in testNetwork.graph.es["pts"]]
+
+        testNetwork.compact_points()
+        edge_points = testNetwork.edge_points
+        assert len(edge_points) == testNetwork.graph.ecount()
+        for i, pts in enumerate(edge_pts):
+            npt.assert_array_equal(edge_points[i], pts)
+            npt.assert_array_equal(testNetwork.graph.es[i]["pts"], pts)
+        assert np.shares_memory(
+            testNetwork.graph.es[0]["pts"], edge_points.points
+        )
+
+        testNetwork.graph.delete_edges([0])
+        assert len(testNetwork.edge_points) == testNetwork.graph.ecount()
+
+    def test_sweep(self, tmp_path):
+        shutil.copy(AgNWN_path + "slice0000.tif", tmp_path)
+        testNetwork = Network(tmp_path, prefix="slice")
+        variants = [
+            {"crop": [0, 300, 0, 300], "options": options.agnwn_high_thresh},
+            {"crop": [0, 500, 0, 500], "options": dict(options.agnwn),
+             "prune": 2},
+            {"crop": [0, 500, 0, 500]},
+        ]
+        testNetwork.sweep(variants)
+
+        filename = testNetwork.stack_dir / "sweep.gsd"
+        with gsd.hoomd.open(filename) as f:
+            assert len(f) == len(variants)
+        lastNetwork = Network.from_gsd(filename, frame=2)
+        assert lastNetwork.graph.vcount() == testNetwork.graph.vcount()
+        assert set(lastNetwork.graph.get_edgelist()) == {
+            tuple(sorted(edge)) for edge in testNetwork.graph.get_edgelist()
+        }
+        assert str(lastNetwork.cropper) == str(testNetwork.cropper)
+
+        # Binarization and post-processing options are those of each frame
+        firstNetwork = Network.from_gsd(filename, frame=0)
+        assert (
+            firstNetwork.options["thresh"]
+            == options.agnwn_high_thresh["thresh"]
+        )
+        assert lastNetwork.options["thresh"] == options.agnwn["thresh"]
+        assert Network.from_gsd(filename, frame=1).options["prune"] == 2
+        assert "prune" not in firstNetwork.options
+        assert "prune" not in lastNetwork.options
+
+    def test_stage_cache(self, monkeypatch, tmp_path):
+        def run():
+            testNetwork = Network(
+                AgNWN_path, prefix="slice", binarized_dir=tmp_path, cache=True
+            )
+            testNetwork.binarize(options=options.agnwn)
+            testNetwork.img_to_skel(crop=[0, 500, 0, 500], write=False)
+            testNetwork.set_graph(
+                weight_type=["FixedWidthConductance"], R_j=10, write=False
+            )
+            return testNetwork
+
+        testNetwork = run()
+        cache_dir = testNetwork.stack_dir / "cache"
+        assert len(list(cache_dir.glob("*.npz"))) == 3
+
+        def fail(*args, **kwargs):
+            raise AssertionError("Cached stage was recalculated")
+
+        monkeypatch.setattr(StructuralGT.networks, "skeletonize", fail)
+        monkeypatch.setattr(base, "skel_to_G", fail)
+        cachedNetwork = run()
+        npt.assert_array_equal(testNetwork.img_bin, cachedNetwork.img_bin)
+        npt.assert_array_equal(
+            testNetwork.skeleton_3d, cachedNetwork.skeleton_3d
+        )
+        assert (
+            testNetwork.graph.get_edgelist()
+            == cachedNetwork.graph.get_edgelist()
+        )
+        npt.assert_array_equal(
+            testNetwork.graph.es["Conductance"],
+            cachedNetwork.graph.es["Conductance"],
+        )
+        for i in range(testNetwork.graph.ecount()):
+            npt.assert_array_equal(
+                testNetwork.graph.es[i]["pts"],
+                cachedNetwork.graph.es[i]["pts"],
+            )
+
+        cachedNetwork.invalidate_cache("set_graph")
+        assert len(list(cache_dir.glob("set_graph-*.npz"))) == 0
+        assert len(list(cache_dir.glob("*.npz"))) == 2
+
+        cachedNetwork._cache.max_size = 0
+        cachedNetwork._cache.evict()
+        assert len(list(cache_dir.glob("*.npz"))) == 0
+
+    def test_profile(self, tmp_crop, caplog):
+        testNetwork = tmp_crop
+        with caplog.at_level("INFO", logger="StructuralGT"):
+            testNetwork.set_graph(write=False)
+            Size().compute(testNetwork)
+
+        profile = testNetwork.profile
+        assert list(profile["stage"]) == [
+            "binarize",
+            "img_to_skel",
+            "set_graph",
+            "Size.compute",
+        ]
+        records = profile.set_index("stage")
+        assert records.loc["img_to_skel", "voxels"] == len(
+            testNetwork.positions
+        )
+        assert records.loc["Size.compute", "nodes"] == (
+            testNetwork.graph.vcount()
+        )
+        assert (profile["wall_time"] >= 0).all()
+        assert any(
+            getattr(record, "profile", {}).get("stage") == "Size.compute"
+            for record in caplog.records
+        )
+
+    def test_skip_skel_write(self, tmp_crop):
+        testNetwork = tmp_crop
+        testNetwork.img_to_skel(name="unwritten_skel.gsd", write=False)
+        testNetwork.set_graph(write=False)
+
+        assert not testNetwork.skel_name.exists()
+        assert testNetwork.graph.vcount() > 0
+
+    def test_resume_binarized(self, tmp_crop):
+        testNetwork = tmp_crop
+        # The binarized slices are released once img_bin is set
+        assert all(
+            isinstance(name, Path)
+            for name in testNetwork.image_stack_bin._images
+        )
+        testNetwork.img_to_skel(crop=[0, 300, 0, 300], write=False)
+        npt.assert_array_equal(
+            testNetwork.img_bin,
+            testNetwork.image_stack_bin[0][0][:300, :300] != 0,
+        )
+        testNetwork.img_to_skel(crop=[0, 500, 0, 500], write=False)
+
+        resumedNetwork = Network(
+            AgNWN_path, prefix="slice", binarized_dir=testNetwork.stack_dir
+        )
+        resumedNetwork.img_to_skel(crop=[0, 500, 0, 500], write=False)
+
+        npt.assert_array_equal(testNetwork.img_bin, resumedNetwork.img_bin)
+
     def test_from_gsd(self):
         writeNetwork = Network(Small_path, binarized_dir="HighThresh")
         writeNetwork.binarize(options=options.agnwn)
@@ -101,6 +466,10 @@ class TestNetwork:
         testNetwork = Network.from_gsd(Small_path + "HighThresh/network.gsd")
 
         testNetwork.Gr.vs["o"][0]
+        npt.assert_array_equal(
+            testNetwork.node_points.lens,
+            [len(pts) for pts in writeNetwork.graph.vs["pts"]],
+        )
 
 
 class TestGraph:
@@ -108,6 +477,52 @@ class TestGraph:
         testGraph = Graph(Small_path + "Binarized/network.gsd")
         testGraph.vs["o"][0]
 
+    def test_adjacency_loader(self):
+        filename = Small_path + "Binarized/network.gsd"
+        testGraph = Graph(filename)
+
+        with gsd.hoomd.open(filename) as f:
+            s = f[0]
+        S = scipy.sparse.csr_matrix(
+            (s.log["Adj_values"], (s.log["Adj_rows"], s.log["Adj_cols"]))
+        )
+        refGraph = ig.Graph.Weighted_Adjacency(S, mode="upper")
+
+        assert testGraph.vcount() == refGraph.vcount()
+        assert testGraph.get_edgelist() == refGraph.get_edgelist()
+        npt.assert_array_equal(testGraph.es["weight"], refGraph.es["weight"])
+        npt.assert_array_equal(
+            testGraph.vs["o"], s.particles.position[s.particles.typeid == 2]
+        )
+
+    def test_split(self):
+        points = np.arange(12).reshape(6, 2)
+        pts = base.split(points, [1, 3, 2])
+        assert len(pts) == 3
+        npt.assert_array_equal(pts[1], points[1:4])
+        npt.assert_array_equal(pts[2], points[4:])
+
+    def test_connectors(self):
+        point1 = np.array([-10, 196])
+        points2 = np.array([[3, 17], [40, 196], [-10, 196], [7, 300]])
+        lines = base.connectors(point1, points2)
+        assert len(lines) == len(points2)
+        for point2, line in zip(points2, lines):
+            # Lattice points of a line sampled at 50 points
+            ref = np.unique(
+                (point1 + np.linspace(0, 1)[:, None] * (point2 - point1))
+                .astype(int),
+                axis=0,
+            )
+            npt.assert_array_equal(np.unique(line, axis=0), ref)
+            assert len(line) == len(ref)
+            npt.assert_array_equal(line[0], point1)
+            npt.assert_array_equal(line[-1], point2)
+        npt.assert_array_equal(
+            base.connector(point1, points2[0]), lines[0]
+        )
+        assert base.connectors(point1, points2[:0]) == []
+
 class TestDecoupledIO:
     """
     "DecoupledIO" refers to the ***. However because this is the IO employed
@@ -116,7 +531,11 @@ class TestDecoupledIO:
     """
 
     @pytest.fixture
-    def test_2d_constructor(self):
+    def out_path(self, data_copy):
+        return data_copy / "StructuralGT/pytest/data/out_dir"
+
+    @pytest.fixture
+    def test_2d_constructor(self, out_path):
 
         return Network(AgNWN_path, binarized_dir=out_path)
 
@@ -126,7 +545,7 @@ class TestDecoupledIO:
 
         return test_2d_constructor
 
-    def test_2d_graph(self, test_2d_binarize):
+    def test_2d_graph(self, test_2d_binarize, out_path):
         test_2d_binarize.img_to_skel()
         test_2d_binarize.set_graph()
 
@@ -134,7 +553,7 @@ class TestDecoupledIO:
         os.remove(Path(out_path / "network.gsd"))
 
     @pytest.fixture
-    def test_3d_constructor(self):
+    def test_3d_constructor(self, out_path):
 
         testNetwork = Network(ANF_path,
                               dim=3, prefix="slice",
@@ -149,7 +568,7 @@ class TestDecoupledIO:
 
         return test_3d_constructor
 
-    def test_3d_graph(self, test_2d_binarize):
+    def test_3d_graph(self, test_2d_binarize, out_path):
         test_2d_binarize.img_to_skel()
         test_2d_binarize.set_graph()
 
@@ -187,7 +606,7 @@ class TestPointNetwork:
             filename=PointNetwork_path + "labelled.gsd",
         )
 
-    def test_write_edgelist(self):
+    def test_write_edgelist(self, tmp_path):
         # Read edge list with whitespace as delimiter
         df = pd.read_csv(EdgeList_path + "Connectivity.dat", sep=r"\s+")
         edge_list = df[["node1", "node2"]].values
@@ -208,6 +627,23 @@ class TestPointNetwork:
             filename=EdgeList_path + "labelled.gsd",
         )
 
+        N.node_labelling(
+            [np.ones(N.graph.vcount())],
+            ["Ones"],
+            filename=tmp_path / "labelled.gsd",
+            csv_write=True,
+            npy_write=True,
+        )
+        edges = np.load(tmp_path / "edgeList.npy")
+        npt.assert_array_equal(edges, N.graph.get_edgelist())
+        npt.assert_array_equal(
+            np.load(tmp_path / "vertexPositions.npy"), N.positions
+        )
+        npt.assert_array_equal(
+            pd.read_csv(tmp_path / "edgeList.csv", header=None).values,
+            edges,
+        )
+
     def test_from_gsd(self):
         N = PointNetwork.from_gsd(
             PointNetwork_path + "labelled.gsd",
@@ -0,0 +1,95 @@
+# Copyright (c) 2023-2024 The Regents of the University of Michigan.
+# This file is from the StructuralGT project, released under the BSD 3-Clause
+# License.
+
+import gsd.hoomd
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from StructuralGT import base, sknwEdits
+
+ANF_skel = "StructuralGT/pytest/data/ANF/Binarized/skel.gsd"
+AgNWN_skel = "StructuralGT/pytest/data/AgNWN/Binarized/skel.gsd"
+
+
+def skel_canvas(skel_name):
+    frame = gsd.hoomd.open(name=skel_name, mode="r")[0]
+    positions = base.shift(frame.particles.position.astype(int))[0]
+    positions = positions.T[np.ptp(positions, axis=0) > 0].T
+    canvas = np.zeros(positions.max(axis=0) + 1, dtype=int)
+    canvas[tuple(positions.T)] = 1
+
+    return canvas
+
+
+class TestMark:
+    @pytest.mark.parametrize("skel_name", [ANF_skel, AgNWN_skel])
+    def test_vectorized(self, skel_name):
+        canvas = np.pad(skel_canvas(skel_name), (1, 1), mode="constant")
+        nbs = sknwEdits.neighbors(canvas.shape)
+
+        looped = canvas.copy()
+        sknwEdits.mark(looped, nbs)
+        vectorized = canvas.copy()
+        sknwEdits.mark_vectorized(vectorized, nbs)
+
+        npt.assert_array_equal(looped, vectorized)
+
+    @pytest.mark.parametrize("skel_name", [ANF_skel, AgNWN_skel])
+    def test_build_sknw(self, skel_name):
+        canvas = skel_canvas(skel_name)
+        looped = sknwEdits.build_sknw(canvas, vectorized=False)
+        vectorized = sknwEdits.build_sknw(canvas, vectorized=True)
+
+        assert looped.get_edgelist() == vectorized.get_edgelist()
+        npt.assert_array_equal(looped.vs["o"], vectorized.vs["o"])
+
+    @pytest.mark.parametrize("dtype", [bool, np.uint8, np.int64])
+    def test_skeleton_dtype(self, dtype):
+        canvas = skel_canvas(AgNWN_skel)
+        G = sknwEdits.build_sknw(canvas)
+        _G = sknwEdits.build_sknw(canvas.astype(dtype))
+
+        assert G.get_edgelist() == _G.get_edgelist()
+        npt.assert_array_equal(G.vs["o"], _G.vs["o"])
+
+
+class TestParseStruc:
+    @pytest.mark.parametrize("skel_name", [ANF_skel, AgNWN_skel])
+    def test_compiled(self, skel_name):
+        if sknwEdits._parse_struc is None:
+            pytest.skip("The compiled skeleton tracer was not built.")
+        canvas = np.pad(skel_canvas(skel_name), (1, 1), mode="constant")
+        canvas = canvas.astype(np.int32)
+        nbs = sknwEdits.neighbors(canvas.shape)
+        acc = np.cumprod((1,) + canvas.shape[::-1][:-1])[::-1]
+        sknwEdits.mark_vectorized(canvas, nbs)
+
+        nodes, edges = sknwEdits.parse_struc(
+            canvas.copy(), nbs, acc, True, True
+        )
+        _nodes, _edges = sknwEdits._parse_struc(
+            canvas.copy(), nbs, acc, True, True
+        )
+
+        assert len(nodes) == len(_nodes)
+        for node, _node in zip(nodes, _nodes):
+            npt.assert_array_equal(node, _node)
+        assert len(edges) == len(_edges)
+        for edge, _edge in zip(edges, _edges):
+            assert edge[0:2] == _edge[0:2]
+            npt.assert_array_equal(edge[2], _edge[2])
+
+
+class TestSparse:
+    @pytest.mark.parametrize("skel_name", [ANF_skel, AgNWN_skel])
+    def test_build_sknw_sparse(self, skel_name):
+        canvas = skel_canvas(skel_name)
+        dense = sknwEdits.build_sknw(canvas)
+        sparse = sknwEdits.build_sknw_sparse(np.argwhere(canvas))
+
+        assert dense.get_edgelist() == sparse.get_edgelist()
+        npt.assert_array_equal(dense.vs["o"], sparse.vs["o"])
+        for pts, _pts in zip(dense.es["pts"], sparse.es["pts"]):
+            npt.assert_array_equal(pts, _pts)
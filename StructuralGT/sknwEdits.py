@@ -7,6 +7,11 @@
 import igraph as ig
 import numpy as np
 
+try:
+    from StructuralGT._sknw import parse_struc as _parse_struc
+except ImportError:
+    _parse_struc = None
+
 
 # For an unravelled image, this returns the relative indices for the
 # neighbours of a given image shape.
@@ -42,6 +47,19 @@ def mark(img, nbs):  # mark the array use (0, 1, 2)
             img[p] = 2
 
 
+# Vectorized equivalent of mark. Rather than visiting each voxel in turn, the
+# number of non-zero neighbours of every foreground voxel is accumulated by
+# summing over the neighbour offsets. The image must be padded (as it is in
+# build_sknw) so that p + dp never falls outside of the raveled array.
+def mark_vectorized(img, nbs):
+    img = img.ravel()
+    fg = np.flatnonzero(img)
+    s = np.zeros(len(fg), dtype=np.uint8)
+    for dp in nbs:
+        s += img[fg + dp] != 0
+    img[fg] = np.where(s == 2, 1, 2)
+
+
 # idx is indices of neighbours of a node which are also nodes
 # Function converts index locations in img to coordinates
 def idx2rc(idx, acc):
@@ -108,7 +126,9 @@ def trace(img, p, nbs, acc, buf):
 
 def parse_struc(img, nbs, acc, iso, ring):
     img = img.ravel()
-    buf = np.zeros(131072000, dtype=np.int64)
+    # No node or edge can hold more voxels than the skeleton has, and trace
+    # additionally stores the two terminating node voxels.
+    buf = np.zeros(np.count_nonzero(img) + 2, dtype=np.int64)
     # The image array is marked with num, where values of the same num
     # correspond to voxels belonging to the same node
     num = 10
@@ -143,6 +163,115 @@ def parse_struc(img, nbs, acc, iso, ring):
     return nodes, edges
 
 
+# Sparse counterparts of mark, fill, trace and parse_struc. The skeleton is
+# represented by the sorted raveled indices, idx, of its voxels in the padded
+# image, and nbr[p] holds the positions in idx of the neighbours of voxel p,
+# with len(idx) standing for background. img holds the marks of each voxel,
+# followed by a single, never modified, background entry. Voxels are visited
+# in the same (raveled) order as the dense functions, so the results are
+# identical.
+def neighbor_table(idx, nbs):
+    n = len(idx)
+    nbr = np.full((n, len(nbs)), n, dtype=np.int64)
+    for k, dp in enumerate(nbs):
+        j = np.searchsorted(idx, idx + dp)
+        j[j == n] = 0
+        found = idx[j] == idx + dp
+        nbr[found, k] = j[found]
+    return nbr
+
+
+def mark_sparse(nbr):
+    n = len(nbr)
+    img = np.zeros(n + 1, dtype=np.int64)
+    s = np.count_nonzero(nbr != n, axis=1)
+    img[:n] = np.where(s == 2, 1, 2)
+    return img
+
+
+def fill_sparse(img, p, num, nbr, idx, acc, buf):
+    img[p] = num
+    buf[0] = p
+    cur = 0
+    s = 1
+    iso = True
+
+    while True:
+        p = buf[cur]
+        for cp in nbr[p]:
+            if img[cp] == 2:
+                img[cp] = num
+                buf[s] = cp
+                s += 1
+            if img[cp] == 1:
+                iso = False
+        cur += 1
+        if cur == s:
+            break
+    return iso, idx2rc(idx[buf[:s]], acc)
+
+
+def trace_sparse(img, p, nbr, idx, acc, buf):
+    c1 = 0
+    c2 = 0
+    newp = 0
+    cur = 1
+    while True:
+        buf[cur] = p
+        img[p] = 0
+        cur += 1
+        for cp in nbr[p]:
+            if img[cp] >= 10:
+                if c1 == 0:
+                    c1 = img[cp]
+                    buf[0] = cp
+                else:
+                    c2 = img[cp]
+                    buf[cur] = cp
+            if img[cp] == 1:
+                newp = cp
+        p = newp
+        if c2 != 0:
+            break
+
+    return (c1 - 10, c2 - 10, idx2rc(idx[buf[: cur + 1]], acc))
+
+
+def parse_struc_sparse(img, nbr, idx, acc, iso, ring):
+    n = len(idx)
+    buf = np.zeros(n + 2, dtype=np.int64)
+    num = 10
+    nodes = []
+    for p in range(n):
+        if img[p] == 2:
+            isiso, nds = fill_sparse(img, p, num, nbr, idx, acc, buf)
+            if isiso and not iso:
+                continue
+            num += 1
+            nodes.append(nds)
+    edges = []
+    for p in range(n):
+        if img[p] < 10:
+            continue
+        for cp in nbr[p]:
+            if img[cp] == 1:
+                edge = trace_sparse(img, cp, nbr, idx, acc, buf)
+                edges.append(edge)
+    if not ring:
+        return nodes, edges
+    for p in range(n):
+        if img[p] != 1:
+            continue
+        img[p] = num
+        num += 1
+        nodes.append(idx2rc(idx[[p]], acc))
+        for cp in nbr[p]:
+            if img[cp] == 1:
+                edge = trace_sparse(img, cp, nbr, idx, acc, buf)
+                edges.append(edge)
+    return nodes, edges
+
+
 # use nodes and edges build a networkx graph
 def build_graph(nodes, edges, multi=False, full=True):
     # i is list of node positions where each item in list corresponds to a
@@ -179,12 +308,43 @@ def mark_node(ske):
     return buf
 
 
-def build_sknw(ske, multi=False, iso=True, ring=True, full=True):
-    buf = np.pad(ske, (1, 1), mode="constant")
+def build_sknw(
+    ske, multi=False, iso=True, ring=True, full=True, vectorized=True
+):
+    # The skeleton may be of any dtype, where non-zero voxels belong to the
+    # skeleton. It is padded directly into an int32 buffer, which is large
+    # enough for the node labels, rather than into a copy of its own dtype.
+    ske = np.asarray(ske)
+    buf = np.zeros(np.add(ske.shape, 2), dtype=np.int32)
+    buf[(slice(1, -1),) * ske.ndim] = ske != 0
     nbs = neighbors(buf.shape)  # Relative indices of neighbors
     acc = np.cumprod((1,) + buf.shape[::-1][:-1])[::-1]
-    mark(buf, nbs)
-    nodes, edges = parse_struc(buf, nbs, acc, iso, ring)
+    if vectorized:
+        mark_vectorized(buf, nbs)
+    else:
+        mark(buf, nbs)
+    if _parse_struc is not None:
+        nodes, edges = _parse_struc(buf, nbs, acc, iso, ring)
+    else:
+        nodes, edges = parse_struc(buf, nbs, acc, iso, ring)
+    return build_graph(nodes, edges, multi, full)
+
+
+def build_sknw_sparse(pts, multi=False, iso=True, ring=True, full=True):
+    """Equivalent of build_sknw for a skeleton given as an array of voxel
+    coordinates, shifted such that their minimum is the origin. The dense
+    skeleton is never allocated, so memory scales with the number of
+    skeleton voxels rather than with the volume enclosing them.
+    """
+    pts = np.asarray(pts, dtype=np.int64)
+    pts = pts - pts.min(axis=0)
+    shape = tuple(pts.max(axis=0) + 3)  # Padded, as in build_sknw
+    nbs = neighbors(shape)
+    acc = np.cumprod((1,) + shape[::-1][:-1])[::-1]
+    idx = np.unique(np.dot(pts + 1, acc))
+    nbr = neighbor_table(idx, nbs)
+    img = mark_sparse(nbr)
+    nodes, edges = parse_struc_sparse(img, nbr, idx, acc, iso, ring)
     return build_graph(nodes, edges, multi, full)
 
 
@@ -2,14 +2,96 @@
 # This file is from the StructuralGT project, released under the BSD 3-Clause
 # License.
 
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
 from functools import wraps
 from pathlib import Path
 
 import igraph as ig
+import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 
 from StructuralGT import base, error
 
+logger = logging.getLogger(__name__)
+
+
+def _peak_memory():
+    """Returns the peak resident memory of the process so far, in bytes, or
+    :code:`None` where this is not available (e.g. on Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _record_profile(network, stage, wall, cpu, counts):
+    """Records the profile of a stage which started at wall time
+    :code:`wall` and CPU time :code:`cpu`. The record is appended to the
+    network's profile, if it keeps one, and logged at :code:`INFO` level
+    with the record in the :code:`profile` attribute of the log record.
+    """
+    record = {
+        "stage": stage,
+        "wall_time": time.perf_counter() - wall,
+        "cpu_time": time.process_time() - cpu,
+        "peak_memory": _peak_memory(),
+        **counts,
+    }
+    records = getattr(network, "_profile_records", None)
+    if records is not None:
+        records.append(record)
+    logger.info(
+        "Ran %s in %.3f s (%.3f s CPU) %s",
+        stage,
+        record["wall_time"],
+        record["cpu_time"],
+        counts,
+        extra={"profile": record},
+    )
+
+
+def _profiled(stage, **counts):
+    """Decorator which records the wall time, CPU time and peak memory of a
+    :class:`Network` method with :func:`_record_profile`. Each keyword
+    argument is a function of the network, evaluated after the method, which
+    returns an element count to include in the record (e.g. the number of
+    skeleton voxels).
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            wall, cpu = time.perf_counter(), time.process_time()
+            value = method(self, *args, **kwargs)
+            _counts = {}
+            for name, count in counts.items():
+                try:
+                    _counts[name] = count(self)
+                except (AttributeError, TypeError):
+                    _counts[name] = None
+            _record_profile(self, stage, wall, cpu, _counts)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def _graph_counts(network):
+    """Returns the node and edge counts of the graph of a network, or of an
+    :class:`igraph.Graph`, for profile records."""
+    graph = network if isinstance(network, ig.Graph) else network.graph
+    return {"nodes": graph.vcount(), "edges": graph.ecount()}
+
 
 class _Compute:
     r"""Parent class for all compute classes in StructuralGT. Modelled after
@@ -51,8 +133,21 @@ class _Compute:
 
             @wraps(compute)
             def compute_wrapper(*args, **kwargs):
+                wall, cpu = time.perf_counter(), time.process_time()
                 return_value = compute(*args, **kwargs)
                 self._called_compute = True
+                network = args[0] if args else kwargs.get("network")
+                try:
+                    counts = _graph_counts(network)
+                except AttributeError:
+                    counts = {}
+                _record_profile(
+                    network,
+                    type(self).__name__ + ".compute",
+                    wall,
+                    cpu,
+                    counts,
+                )
                 return return_value
 
             return compute_wrapper
@@ -114,23 +209,371 @@ class _Compute:
         return wrapper
 
 
+def _read_image(name, read_type=None):
+    """Reads an image file. Uncompressed TIFF files are memory-mapped, so
+    that only the parts of the image which are indexed are read from disk.
+
+    Args:
+        name (str):
+            Name of file.
+        read_type (int, optional):
+            OpenCV read flag, e.g. :code:`cv.IMREAD_GRAYSCALE`. If given,
+            non-memory-mappable files are read with :func:`base.read`.
+            Otherwise, they are read with :func:`matplotlib.pyplot.imread`.
+
+    Returns:
+        :class:`numpy.ndarray`: The image.
+    """
+    name = str(name)
+    if name.endswith(".tiff") or name.endswith(".tif"):
+        try:
+            import tifffile
+
+            image = tifffile.memmap(name, mode="r")
+            if read_type is None or image.ndim == 2:
+                return image
+        except (ImportError, ValueError):
+            pass
+    if read_type is None:
+        return plt.imread(name)
+    return base.read(name, read_type)
+
+
+def _stack_points(points, dim):
+    """Concatenates a list of point arrays, such as the :code:`"pts"`
+    attribute of every vertex or edge of a graph, in a single pass.
+
+    Args:
+        points (list[:class:`numpy.ndarray`]):
+            Arrays of points, each with shape (n, dim) or (dim,).
+        dim (int):
+            The number of coordinates of each point.
+
+    Returns:
+        :class:`numpy.ndarray`: The (N, dim) array of all points.
+    """
+    if len(points) == 0:
+        return np.empty((0, dim))
+    return np.concatenate(
+        [np.reshape(p, (-1, dim)) for p in points]
+    ).astype(float)
+
+
+class _point_store:
+    """Class for holding the points of every vertex or edge of a graph in a
+    single flat array, in CSR style. The points of element :code:`i` are
+    :code:`points[offsets[i]:offsets[i + 1]]`.
+
+    Args:
+        points (:class:`numpy.ndarray`):
+            The (N, dim) array of all points, in ascending order of element
+            id.
+        lens (:class:`numpy.ndarray`):
+            The number of points of each element.
+    """
+
+    def __init__(self, points, lens):
+        self.points = points
+        self.offsets = np.zeros(len(lens) + 1, dtype=np.int64)
+        np.cumsum(lens, out=self.offsets[1:])
+
+    @classmethod
+    def from_list(cls, pts, dim):
+        """Alternative constructor from a list of point arrays, such as the
+        :code:`"pts"` attribute of every vertex or edge of a graph.
+        """
+        pts = [np.reshape(p, (-1, dim)) for p in pts]
+        lens = np.fromiter(
+            (len(p) for p in pts), dtype=np.int64, count=len(pts)
+        )
+        if len(pts) == 0:
+            return cls(np.empty((0, dim), dtype=int), lens)
+        return cls(np.concatenate(pts), lens)
+
+    @property
+    def lens(self):
+        """:class:`numpy.ndarray`: The number of points of each element."""
+        return np.diff(self.offsets)
+
+    def views(self):
+        """Returns the points of each element as a list of views into
+        :attr:`points`, which share its memory.
+        """
+        return np.split(self.points, self.offsets[1:-1])
+
+    def __getitem__(self, key):
+        return self.points[self.offsets[key] : self.offsets[key + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def _graph_to_arrays(G, dim):
+    """Returns the arrays from which :func:`_graph_from_arrays` rebuilds a
+    graph, or :code:`None` if the graph has an attribute which is not
+    numeric. Points are held as :class:`_point_store` arrays.
+    """
+    node_points = _point_store.from_list(G.vs["pts"], dim)
+    edge_points = _point_store.from_list(G.es["pts"], dim)
+    arrays = {
+        "n": np.asarray(G.vcount()),
+        "edges": np.asarray(G.get_edgelist(), dtype=np.int64).reshape(-1, 2),
+        "node_points": node_points.points,
+        "node_lens": node_points.lens,
+        "edge_points": edge_points.points,
+        "edge_lens": edge_points.lens,
+    }
+    for prefix, seq in (("vs:", G.vs), ("es:", G.es)):
+        for name in seq.attributes():
+            if name == "pts":
+                continue
+            values = np.asarray(seq[name])
+            if values.dtype == object:
+                return None
+            arrays[prefix + name] = values
+
+    return arrays
+
+
+def _graph_from_arrays(arrays):
+    """Rebuilds a graph from the arrays returned by
+    :func:`_graph_to_arrays`.
+
+    Returns:
+        :class:`igraph.Graph`: The graph.
+        :class:`_point_store`: The points of every node.
+        :class:`_point_store`: The points of every edge.
+    """
+    G = ig.Graph(n=int(arrays["n"]), edges=arrays["edges"].tolist())
+    node_points = _point_store(arrays["node_points"], arrays["node_lens"])
+    edge_points = _point_store(arrays["edge_points"], arrays["edge_lens"])
+    G.vs["pts"] = node_points.views()
+    G.es["pts"] = edge_points.views()
+    for key, values in arrays.items():
+        if key.startswith("vs:"):
+            G.vs[key[3:]] = list(values)
+        elif key.startswith("es:"):
+            G.es[key[3:]] = list(values)
+
+    return G, node_points, edge_points
+
+
+def _gsd_graph(frame):
+    """Builds the graph stored in a :code:`.gsd` frame written by
+    :meth:`Network.node_labelling`, along with the frame's particle positions
+    grouped by type.
+
+    The edge list is read straight from the upper triangle of the stored
+    adjacency matrix, so the graph is the same as the one returned by
+    :meth:`igraph.Graph.Weighted_Adjacency` with :code:`mode="upper"`,
+    without building an intermediate sparse matrix.
+
+    Args:
+        frame (:class:`gsd.hoomd.Frame`):
+            The frame to read.
+
+    Returns:
+        :class:`igraph.Graph`: The graph, with edge weights in the
+        :code:`"weight"` attribute.
+        list[:class:`numpy.ndarray`]: The edge, node and centroid positions.
+    """
+    rows = np.asarray(frame.log["Adj_rows"], dtype=np.int64)
+    cols = np.asarray(frame.log["Adj_cols"], dtype=np.int64)
+    values = np.asarray(frame.log["Adj_values"])
+    n = int(max(rows.max(initial=-1), cols.max(initial=-1))) + 1
+
+    upper = rows <= cols
+    keys, inverse = np.unique(
+        rows[upper] * n + cols[upper], return_inverse=True
+    )
+    weights = np.bincount(
+        inverse.ravel(), weights=values[upper], minlength=len(keys)
+    )
+    edges = np.column_stack((keys // n, keys % n))
+
+    Gr = ig.Graph(n=n, edges=edges.tolist())
+    Gr.es["weight"] = weights.tolist()
+
+    typeid = np.asarray(frame.particles.typeid)
+    order = np.argsort(typeid, kind="stable")
+    offsets = np.cumsum(np.bincount(typeid, minlength=3)[:3])[:-1]
+    positions = np.split(frame.particles.position[order], offsets)
+
+    return Gr, positions
+
+
+def _write_graph_lists(directory, positions, graph, csv=False, npy=False):
+    """Writes the vertex positions and edge list of a graph to
+    :code:`vertexPositions` and :code:`edgeList` files in a directory.
+
+    Args:
+        directory (:class:`pathlib.Path`):
+            The directory to write to.
+        positions (:class:`numpy.ndarray`):
+            The (N, dim) vertex positions, in ascending order of node id.
+        graph (:class:`igraph.Graph`):
+            The graph whose edge list is written.
+        csv (bool, optional):
+            Whether to write comma separated :code:`.csv` files.
+        npy (bool, optional):
+            Whether to write binary NumPy :code:`.npy` files, which are much
+            faster to write and read than :code:`.csv` files.
+    """
+    edgelist = np.asarray(graph.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    if csv:
+        pd.DataFrame(positions).to_csv(
+            directory / "vertexPositions.csv", header=False, index=False
+        )
+        pd.DataFrame(edgelist).to_csv(
+            directory / "edgeList.csv", header=False, index=False
+        )
+    if npy:
+        np.save(directory / "vertexPositions.npy", np.asarray(positions))
+        np.save(directory / "edgeList.npy", edgelist)
+
+
+def _hash_update(h, part):
+    """Updates a hash with a stage input. Arrays are hashed by their bytes,
+    so that large arrays are not summarised as they would be by
+    :func:`repr`."""
+    if isinstance(part, np.ndarray):
+        h.update(repr((part.shape, part.dtype.str)).encode())
+        h.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, (list, tuple)):
+        h.update(b"[")
+        for item in part:
+            _hash_update(h, item)
+        h.update(b"]")
+    elif isinstance(part, dict):
+        h.update(b"{")
+        for k in sorted(part, key=str):
+            _hash_update(h, k)
+            _hash_update(h, part[k])
+        h.update(b"}")
+    else:
+        h.update(repr(part).encode())
+    h.update(b";")
+
+
+class _stage_cache:
+    """Class for caching the outputs of pipeline stages in :code:`.npz`
+    files, which are named by a hash of the inputs and options of the stage.
+    When the total size of the cache exceeds :attr:`max_size`, the least
+    recently used entries are deleted.
+
+    Args:
+        directory (:class:`pathlib.Path`):
+            The directory holding the cache entries.
+        max_size (int):
+            The maximum total size of the cache, in bytes.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = Path(directory)
+        self.max_size = max_size
+
+    @staticmethod
+    def key(*parts):
+        """Returns the hash of the given stage inputs."""
+        h = hashlib.sha256()
+        for part in parts:
+            _hash_update(h, part)
+        return h.hexdigest()
+
+    @staticmethod
+    def file_digest(name):
+        """Returns the hash of the contents of a file."""
+        h = hashlib.sha256()
+        with open(name, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def path(self, stage, key):
+        return self.directory / f"{stage}-{key}.npz"
+
+    def load(self, stage, key):
+        """Returns the arrays cached for a stage, or :code:`None` if there
+        is no entry for the key."""
+        path = self.path(stage, key)
+        try:
+            with np.load(path) as f:
+                arrays = dict(f)
+        except (OSError, ValueError):
+            return None
+        # Marks the entry as recently used
+        os.utime(path)
+        return arrays
+
+    def save(self, stage, key, **arrays):
+        """Caches the arrays output by a stage."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(stage, key)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries, until the cache is no
+        larger than :attr:`max_size`."""
+        entries = sorted(
+            (entry.stat().st_mtime_ns, entry.stat().st_size, entry)
+            for entry in self.directory.glob("*.npz")
+        )
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, entry in entries:
+            if size <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            size -= entry_size
+
+    def invalidate(self, stage=None):
+        """Deletes the cache entries of a stage, or of all stages."""
+        pattern = "*.npz" if stage is None else f"{stage}-*.npz"
+        for entry in self.directory.glob(pattern):
+            entry.unlink(missing_ok=True)
+
+
 class _image_stack:
-    """Class for holding images and the names of their respective files."""
+    """Class for holding images and the names of their respective files.
 
-    def __init__(self):
+    Images may be appended as arrays, or as file paths. Images appended as
+    paths are only decoded when they are accessed.
+
+    Args:
+        read_type (int, optional):
+            OpenCV read flag passed to :func:`_read_image` when decoding
+            images appended as paths.
+    """
+
+    def __init__(self, read_type=None):
         self._images = []
         self._slice_names = []
         self._index = -1
+        self.read_type = read_type
 
     def append(self, _slice, _slice_name):
         self._images.append(_slice)
         self._slice_names.append(_slice_name)
 
+    def _decode(self, _slice):
+        if isinstance(_slice, (str, Path)):
+            return _read_image(_slice, read_type=self.read_type)
+        return _slice
+
     def __getitem__(self, key):
-        return (self._images[key], self._slice_names[key])
+        if isinstance(key, slice):
+            return (
+                np.asarray([self._decode(i) for i in self._images[key]]),
+                self._slice_names[key],
+            )
+        return (self._decode(self._images[key]), self._slice_names[key])
 
-    def package(self):
-        self._images = np.asarray(self._images)
+    @property
+    def names(self):
+        """list: The file names of the images, without decoding them."""
+        return self._slice_names
 
     def __len__(self):
         return len(self._images)
@@ -143,7 +586,7 @@ class _image_stack:
         if self._index >= len(self):
             self._index = -1
             raise StopIteration
-        return self._images[self._index], self._slice_names[self._index]
+        return self[self._index]
 
 
 class _cropper:
@@ -181,7 +624,7 @@ class _cropper:
             self.surface = 0
         elif domain is None:
             self.surface = int(
-                _fname(Network.directory / Network.image_stack[0][1]).num
+                Network.slice_index.num(Network.image_stack.names[0])
             )  # Strip file type and 'slice' then convert to int
         else:
             self.surface = domain[4]
@@ -339,6 +782,129 @@ class _cropper:
         return outer_crop
 
 
+def _slice_num(name, _2d=False):
+    """Returns the 3 or 4 character slice number at the end of an image file
+    name. 2D images are always numbered :code:`0000`.
+
+    Args:
+        name (str):
+            The name of the file.
+        _2d (bool):
+            Whether the image is a 2D image.
+
+    Returns:
+        str: The slice number.
+    """
+    if _2d:
+        return "0000"
+
+    base_name = str(Path(name).stem)
+    if len(base_name) < 4:
+        raise ValueError(
+            f"Attempting to analyze {name} but for 3D networks, "
+            " filenames must end in 3 or 4 digits, indicating the "
+            " depth of the slice."
+        )
+
+    if not base_name[-4::].isnumeric():
+        num = base_name[-3::]
+    else:
+        num = base_name[-4::]
+
+    if not num.isnumeric():
+        raise ValueError(
+            f"Attempting to analyze {name} but for 3D networks, "
+            " filenames must end in 3 or 4 digits, indicating the "
+            " depth of the slice."
+        )
+
+    return num
+
+
+class _slice_index:
+    """Index of the image files in a directory, which maps slice numbers to
+    file names. It is built with a single :func:`os.scandir` pass, so that
+    large directories are only listed once, and can be saved to a
+    :code:`.json` file from which it is reloaded for as long as the
+    directory is unmodified.
+
+    Args:
+        directory (str):
+            The directory containing the images.
+        _2d (bool):
+            Whether the images are 2D images.
+        cache (str, optional):
+            The :code:`.json` file from which to load the index, if it exists
+            and is up to date.
+    """
+
+    def __init__(self, directory, _2d=False, cache=None):
+        self.directory = Path(directory)
+        self._2d = _2d
+        self._mtime = os.stat(self.directory).st_mtime_ns
+
+        names = None
+        if cache is not None and Path(cache).is_file():
+            with open(cache) as json_file:
+                data = json.load(json_file)
+            if data["mtime"] == self._mtime:
+                names = data["names"]
+
+        if names is None:
+            names = self._scan()
+
+        self.names = names
+        self._nums = {}
+        self._paths = {}
+
+    def _scan(self):
+        """list[str]: Lists the image files in the directory."""
+        with os.scandir(self.directory) as entries:
+            return sorted(
+                entry.name
+                for entry in entries
+                if entry.is_file() and base.Q_img(entry.name)
+            )
+
+    def save(self, cache):
+        """Writes the index to a :code:`.json` file. If the directory has
+        been modified since the index was built, e.g. by creating the
+        binarized subdirectory, it is listed again, and the index is saved
+        as up to date only if its image files are unchanged.
+
+        Args:
+            cache (str):
+                The file to write.
+        """
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime != self._mtime and self._scan() == self.names:
+            self._mtime = mtime
+        with open(cache, "w") as json_file:
+            json.dump({"mtime": self._mtime, "names": self.names}, json_file)
+
+    def num(self, name):
+        """str: Returns the slice number of the image file called name."""
+        if name not in self._nums:
+            self._nums[name] = _slice_num(name, _2d=self._2d)
+        return self._nums[name]
+
+    def path(self, num):
+        """:class:`pathlib.Path`: Returns the path of the image file with the
+        given slice number."""
+        if not self._paths:
+            self._paths = {int(self.num(name)): name for name in self.names}
+        return self.directory / self._paths[int(num)]
+
+    def isinrange(self, name, domain):
+        """bool: Returns true iff the image file called name is within the
+        spatial dimensions of the given :class:`_domain` object.
+        """
+        if self._2d:
+            return True
+        num = int(self.num(name))
+        return num > domain.domain[0] and num < domain.domain[1]
+
+
 class _domain:
     """Helper class which returns an infinitely large space when no explicit
     space is associated with the :class:`_domain`
@@ -372,28 +938,7 @@ class _fname:
         self.domain = domain
         self._2d = _2d
 
-        if self._2d:
-            self.num = "0000"
-        else:
-            base_name = str(self.name.stem)
-            if len(base_name) < 4:
-                raise ValueError(
-                    f"Attempting to analyze {name} but for 3D networks, "
-                    " filenames must end in 3 or 4 digits, indicating the "
-                    " depth of the slice."
-                )
-
-            if not base_name[-4::].isnumeric():
-                self.num = base_name[-3::]
-            else:
-                self.num = base_name[-4::]
-
-            if not self.num.isnumeric():
-                raise ValueError(
-                    f"Attempting to analyze {name} but for 3D networks, "
-                    " filenames must end in 3 or 4 digits, indicating the "
-                    " depth of the slice."
-                )
+        self.num = _slice_num(name, _2d=_2d)
 
     @property
     def isinrange(self):
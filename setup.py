@@ -75,6 +75,10 @@ if metadata["C_FLAG"]:
                     language="c++",
                     extra_objects=[extra_obj],
                 ),
+                Extension(
+                    name="StructuralGT._sknw",
+                    sources=["StructuralGT/_sknw.pyx"],
+                ),
                 Extension(
                     name="StructuralGT._average_nodal_connectivity_cast",
                     sources=[